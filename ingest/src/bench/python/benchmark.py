@@ -0,0 +1,316 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+_INGEST_DIR = pathlib.Path(__file__).resolve().parents[3]
+_REPO_DIR = _INGEST_DIR.parent
+
+sys.path.insert(0, str(_INGEST_DIR / 'src' / 'main' / 'python'))
+
+import psycopg2
+from fixtures import ensure_fixtures
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+_DEFAULT_SCALES = [1, 10]
+_DEFAULT_FIXTURE_DIR = _REPO_DIR / 'build' / 'bench' / 'fixtures'
+_DEFAULT_OUTPUT_DIR = _REPO_DIR / 'build' / 'bench'
+
+_STAGES = ['transform', 'sprite_scan', 'setup', 'csv_ingest', 'sprite_ingest', 'post_ingest']
+
+_SPRITE_TABLES = [
+    'pokemon_sprite',
+    'pokemon_official_sprite',
+    'pokemon_default_sprite',
+    'pokemon_misc_sprite',
+    'pokemon_version_sprite',
+]
+
+_PROC_STATUS = pathlib.Path('/proc/self/status')
+_PROC_CLEAR_REFS = pathlib.Path('/proc/self/clear_refs')
+
+
+# Utilities
+
+def _reset_peak_rss():
+    # Linux lets a process reset its own high water mark, elsewhere the peak only ever grows across stages
+    try:
+        _PROC_CLEAR_REFS.write_text('5', encoding = 'utf-8')
+    except OSError:
+        pass
+
+
+def _read_peak_rss():
+    try:
+        for line in _PROC_STATUS.read_text(encoding = 'utf-8').splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _git_revision():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd = _REPO_DIR, capture_output = True, text = True, check = True,
+        ).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd = _REPO_DIR).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+    return f'{revision}-dirty' if dirty else revision
+
+
+def _count_rows(conn, table_names):
+    with conn.cursor() as cur:
+        total = 0
+        for table_name in table_names:
+            cur.execute(f'SELECT count(*) FROM {table_name};')
+            total += cur.fetchone()[0]
+
+    # End the read so its locks do not block the DDL of the next stage
+    conn.commit()
+
+    return total
+
+
+def _dir_size(path):
+    return sum(file.stat().st_size for file in pathlib.Path(path).rglob('*') if file.is_file())
+
+
+def _measure(stage, block):
+    _reset_peak_rss()
+    start = time.perf_counter()
+
+    rows, size_bytes = block()
+
+    wall_seconds = time.perf_counter() - start
+    info(f'{stage}: {rows} rows, {size_bytes} bytes in {wall_seconds:.3f}s')
+
+    return {
+        'stage'           : stage,
+        'wall_seconds'    : wall_seconds,
+        'rows'            : rows,
+        'bytes'           : size_bytes,
+        'rows_per_second' : rows / wall_seconds if wall_seconds else None,
+        'bytes_per_second': size_bytes / wall_seconds if wall_seconds else None,
+        'peak_rss_bytes'  : _read_peak_rss(),
+    }
+
+
+# Worker
+
+def _run_stages(stages):
+    # The ingest modules read their configuration at import time, so they are only imported once the env is set
+    import csv_ingester
+    import sprite_ingester
+    from database_handler import connect_db, connect_pool, setup_db, setup_post_ingest_db
+
+    csv_dir = pathlib.Path(os.environ['POKEAPI_CSV_DIR'])
+    csv_bytes = _dir_size(csv_dir)
+    csv_tables = [table_name for table_name, _, _, _ in csv_ingester._INGESTIONS]
+
+    results = []
+    sprites = []
+
+    def transform():
+        counts = { 'rows': 0, 'bytes': 0 }
+
+        # Drain every mapper into nothing to time parsing and mapping without the database
+        def drain(conn, csv_source, table_name, has_generated_primary = False):
+            while chunk := csv_source.read(64 * 1024):
+                counts['bytes'] += len(chunk)
+                counts['rows'] += chunk.count('\n')
+            counts['rows'] -= 1
+
+        ingest_csv = csv_ingester.ingest_csv
+        csv_ingester.ingest_csv = drain
+        try:
+            for table_name, file_name, block, _ in csv_ingester._INGESTIONS:
+                block(conn = None, table_name = table_name, file_name = file_name)
+        finally:
+            csv_ingester.ingest_csv = ingest_csv
+
+        return counts['rows'], counts['bytes']
+
+    def sprite_scan():
+        sprites.extend(sprite_ingester._collect_sprites())
+        return len(sprites), sum(sprite.size for sprite in sprites)
+
+    if 'transform' in stages:
+        results.append(_measure('transform', transform))
+    if 'sprite_scan' in stages:
+        results.append(_measure('sprite_scan', sprite_scan))
+
+    database_stages = [stage for stage in stages if stage in ('setup', 'csv_ingest', 'sprite_ingest', 'post_ingest')]
+    if not database_stages:
+        return results
+
+    with connect_db() as conn:
+        pool = connect_pool()
+        try:
+            def setup():
+                setup_db(conn)
+                conn.commit()
+                return 0, 0
+
+            def csv_ingest():
+                csv_ingester.ingest_csv_files(pool)
+                return _count_rows(conn = conn, table_names = csv_tables), csv_bytes
+
+            def sprite_ingest():
+                sprite_ingester.ingest_sprites(conn)
+                return _count_rows(conn = conn, table_names = _SPRITE_TABLES), sum(sprite.size for sprite in sprites)
+
+            def post_ingest():
+                setup_post_ingest_db(conn, pool)
+                conn.commit()
+                return _count_rows(conn = conn, table_names = csv_tables + _SPRITE_TABLES), 0
+
+            blocks = { 'setup': setup, 'csv_ingest': csv_ingest, 'sprite_ingest': sprite_ingest, 'post_ingest': post_ingest }
+
+            # Later stages need the tables of the earlier ones, so they always run, only their results are dropped
+            for stage in ('setup', 'csv_ingest', 'sprite_ingest', 'post_ingest'):
+                if stage == 'sprite_ingest' and not sprites:
+                    sprites.extend(sprite_ingester._collect_sprites())
+
+                result = _measure(stage, blocks[stage])
+                if stage in database_stages:
+                    results.append(result)
+
+                if stage == database_stages[-1]:
+                    break
+        finally:
+            pool.closeall()
+
+    return results
+
+
+# Coordinator
+
+def _reset_schema(schema, drop_only = False):
+    with psycopg2.connect(os.environ['DATABASE_URL']) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE;')
+            if not drop_only:
+                cur.execute(f'CREATE SCHEMA {schema};')
+
+        cur = conn.cursor()
+        cur.execute('SHOW server_version;')
+        return cur.fetchone()[0]
+
+
+def _run_scale(scale, args):
+    csv_dir, sprite_dir = ensure_fixtures(root_dir = args.fixture_dir, scale = scale)
+
+    # Every scale loads into its own schema so a run never touches the real tables
+    schema = f'bench_scale_{scale}'
+    server_version = _reset_schema(schema)
+
+    env = {
+        **os.environ,
+        'POKEAPI_CSV_DIR'    : str(csv_dir),
+        'SPRITE_DIR'         : str(sprite_dir),
+        'INGEST_FORCE_RELOAD': 'true',
+        'PGOPTIONS'          : f'{os.getenv("PGOPTIONS", "")} -c search_path={schema}'.strip(),
+    }
+
+    with tempfile.NamedTemporaryFile(suffix = '.json') as output:
+        # A process per scale keeps module state and the peak RSS of one scale out of the next
+        subprocess.run(
+            [
+                sys.executable, __file__, '--worker', '--worker-output', output.name,
+                '--stages', *args.stages,
+            ],
+            cwd = _INGEST_DIR,
+            env = env,
+            check = True,
+        )
+        results = json.loads(pathlib.Path(output.name).read_text(encoding = 'utf-8'))
+
+    if not args.keep_schemas:
+        _reset_schema(schema, drop_only = True)
+
+    for result in results:
+        result['scale'] = scale
+
+    return server_version, results
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description = 'Benchmark the ingest stages against synthetic PokeAPI fixtures')
+    parser.add_argument('--scales', type = int, nargs = '+', default = _DEFAULT_SCALES)
+    parser.add_argument('--stages', nargs = '+', choices = _STAGES, default = _STAGES)
+    parser.add_argument('--fixture-dir', type = pathlib.Path, default = _DEFAULT_FIXTURE_DIR)
+    parser.add_argument('--output', type = pathlib.Path, default = None)
+    parser.add_argument('--keep-schemas', action = 'store_true')
+    parser.add_argument('--worker', action = 'store_true', help = argparse.SUPPRESS)
+    parser.add_argument('--worker-output', type = pathlib.Path, help = argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+# Main function
+
+def main():
+    args = _parse_args()
+
+    if args.worker:
+        results = _run_stages(args.stages)
+        args.worker_output.write_text(json.dumps(results), encoding = 'utf-8')
+        return
+
+    revision = _git_revision()
+    report = {
+        'revision'      : revision,
+        'created_at'    : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python'        : platform.python_version(),
+        'platform'      : platform.platform(),
+        'server_version': None,
+        'results'       : [],
+    }
+
+    for scale in args.scales:
+        info(f'Benchmarking scale {scale}x...')
+        report['server_version'], results = _run_scale(scale = scale, args = args)
+        report['results'].extend(results)
+
+    output = args.output or _DEFAULT_OUTPUT_DIR / f'ingest-{revision}.json'
+    output.parent.mkdir(parents = True, exist_ok = True)
+    output.write_text(json.dumps(report, indent = 2), encoding = 'utf-8')
+
+    info(f'Wrote benchmark results to {output}')
+
+
+if __name__ == '__main__':
+    main()
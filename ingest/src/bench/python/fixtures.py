@@ -0,0 +1,359 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import csv
+import pathlib
+import random
+import shutil
+import struct
+import zlib
+
+# Constants
+
+_SEED = 1025
+
+_BASE_SPECIES = 1025
+_BASE_FORMS = 275
+_BASE_ITEMS = 2180
+_BASE_EVOLUTION_CHAINS = 549
+
+# Upstream numbers forms from 10001, larger scales move them up another power of ten to stay clear of species ids
+_FORM_ID_OFFSET = 10000
+
+# Bump whenever the generated data changes so cached fixtures get regenerated
+_FIXTURE_VERSION = 2
+
+_REGIONS = ['kanto', 'johto', 'hoenn', 'sinnoh', 'unova', 'kalos', 'alola', 'galar', 'hisui', 'paldea']
+
+_GENERATIONS = [
+    'generation-i', 'generation-ii', 'generation-iii', 'generation-iv', 'generation-v', 'generation-vi',
+    'generation-vii', 'generation-viii', 'generation-ix',
+]
+
+# (version group, generation id, versions)
+_VERSION_GROUPS = [
+    ('red-blue', 1, ['red', 'blue']),
+    ('yellow', 1, ['yellow']),
+    ('gold-silver', 2, ['gold', 'silver']),
+    ('crystal', 2, ['crystal']),
+    ('ruby-sapphire', 3, ['ruby', 'sapphire']),
+    ('emerald', 3, ['emerald']),
+    ('firered-leafgreen', 3, ['firered', 'leafgreen']),
+    ('diamond-pearl', 4, ['diamond', 'pearl']),
+    ('platinum', 4, ['platinum']),
+    ('heartgold-soulsilver', 4, ['heartgold', 'soulsilver']),
+    ('black-white', 5, ['black', 'white']),
+    ('black-2-white-2', 5, ['black-2', 'white-2']),
+    ('x-y', 6, ['x', 'y']),
+    ('omega-ruby-alpha-sapphire', 6, ['omega-ruby', 'alpha-sapphire']),
+    ('sun-moon', 7, ['sun', 'moon']),
+    ('ultra-sun-ultra-moon', 7, ['ultra-sun', 'ultra-moon']),
+    ('sword-shield', 8, ['sword', 'shield']),
+    ('scarlet-violet', 9, ['scarlet', 'violet']),
+]
+
+_TYPES = [
+    'normal', 'fighting', 'flying', 'poison', 'ground', 'rock', 'bug', 'ghost', 'steel', 'fire', 'water', 'grass',
+    'electric', 'psychic', 'ice', 'dragon', 'dark', 'fairy', 'stellar',
+]
+
+_GROWTH_RATES = [
+    ('slow', '\\frac{5x^3}{4}'),
+    ('medium', 'x^3'),
+    ('fast', '\\frac{4x^3}{5}'),
+    ('medium-slow', '\\frac{6x^3}{5} - 15x^2 + 100x - 140'),
+    ('slow-then-very-fast', '\\frac{x^3 (100 - x)}{50}'),
+    ('fast-then-very-slow', '\\frac{x^3 (x + 14)}{50}'),
+]
+
+_ITEM_CATEGORY_COUNT = 54
+_POCKET_COUNT = 8
+
+# Sprite directories below sprites/pokemon with the share of pokemon that have a sprite in them
+_SPRITE_DIRS = [
+    ('', 1.0),
+    ('back', 0.9),
+    ('shiny', 1.0),
+    ('back/shiny', 0.9),
+    ('female', 0.1),
+    ('back/female', 0.1),
+    ('shiny/female', 0.1),
+    ('back/shiny/female', 0.1),
+    ('other/official-artwork', 1.0),
+    ('other/official-artwork/shiny', 1.0),
+    ('other/home', 1.0),
+    ('other/home/shiny', 1.0),
+    ('other/home/female', 0.1),
+    ('other/dream-world', 0.6),
+    ('other/showdown', 0.7),
+    ('other/showdown/back', 0.7),
+    ('other/showdown/shiny', 0.7),
+    ('versions/generation-i/red-blue', 0.15),
+    ('versions/generation-i/red-blue/back', 0.15),
+    ('versions/generation-i/red-blue/gray', 0.15),
+    ('versions/generation-i/red-blue/transparent', 0.15),
+    ('versions/generation-i/yellow', 0.15),
+    ('versions/generation-i/yellow/gbc', 0.15),
+    ('versions/generation-ii/crystal', 0.25),
+    ('versions/generation-ii/crystal/shiny', 0.25),
+    ('versions/generation-ii/gold/back/shiny', 0.25),
+    ('versions/generation-iii/emerald', 0.38),
+    ('versions/generation-iii/firered-leafgreen/back', 0.15),
+    ('versions/generation-iv/diamond-pearl/shiny/female', 0.05),
+    ('versions/generation-iv/heartgold-soulsilver/back/shiny', 0.48),
+    ('versions/generation-v/black-white', 0.63),
+    ('versions/generation-v/black-white/animated', 0.63),
+    ('versions/generation-v/black-white/animated/back/shiny', 0.63),
+    ('versions/generation-vi/x-y', 0.7),
+    ('versions/generation-vii/ultra-sun-ultra-moon/shiny', 0.8),
+    ('versions/generation-vii/icons', 0.8),
+    ('versions/generation-viii/icons', 0.85),
+]
+
+_SPRITE_SIZE = 96
+_ANIMATED_FRAMES = 24
+
+
+# Utilities
+
+def _write_csv(csv_dir, file_name, headers, rows):
+    with (csv_dir / f'{file_name}.csv').open('w', encoding = 'utf-8', newline = '') as f:
+        writer = csv.writer(f, lineterminator = '\n')
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def _optional(rng, value, chance):
+    return value if rng.random() < chance else ''
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _png_bytes(rng, size):
+    header = struct.pack('>IIBBBBB', size, size, 8, 6, 0, 0, 0)
+    scanline = b'\x00' + bytes(rng.getrandbits(8) for _ in range(size * 4))
+    pixels = zlib.compress(scanline * size)
+
+    return b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) + _png_chunk(b'IDAT', pixels) + _png_chunk(b'IEND', b'')
+
+
+def _gif_bytes(rng, size, frames):
+    data = bytearray(b'GIF89a' + struct.pack('<HHBBB', size, size, 0, 0, 0))
+
+    for _ in range(frames):
+        data += b'\x21\xf9\x04\x04' + struct.pack('<H', 4) + b'\x00\x00'
+        data += b'\x2c' + struct.pack('<HHHHB', 0, 0, size, size, 0)
+        block = bytes(rng.getrandbits(8) for _ in range(32))
+        data += b'\x02' + bytes([len(block)]) + block + b'\x00'
+
+    return bytes(data + b'\x3b')
+
+
+def _svg_bytes(rng, size):
+    paths = ''.join(
+        f'<path d="M{rng.randint(0, size)} {rng.randint(0, size)}L{rng.randint(0, size)} {rng.randint(0, size)}"/>'
+        for _ in range(64)
+    )
+
+    return f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}">{paths}</svg>'.encode('utf-8')
+
+
+def _form_id_offset(scale):
+    offset = _FORM_ID_OFFSET
+    while offset <= _BASE_SPECIES * scale:
+        offset *= 10
+
+    return offset
+
+
+def _sprite_names(pokemon_id, form_id_offset):
+    yield str(pokemon_id)
+
+    # Forms also ship sprites named after their species with a variant suffix
+    if pokemon_id > form_id_offset:
+        yield f'{pokemon_id - form_id_offset}-{pokemon_id % 7}'
+
+
+# Functions
+
+def generate_csvs(csv_dir, scale, seed = _SEED):
+    rng = random.Random(seed)
+    csv_dir.mkdir(parents = True, exist_ok = True)
+
+    species_count = _BASE_SPECIES * scale
+    form_count = _BASE_FORMS * scale
+    item_count = _BASE_ITEMS * scale
+    chain_count = _BASE_EVOLUTION_CHAINS * scale
+
+    _write_csv(csv_dir, 'regions', ['id', 'identifier'], enumerate(_REGIONS, start = 1))
+    _write_csv(
+        csv_dir, 'generations', ['id', 'main_region_id', 'identifier'],
+        ((i, i, identifier) for i, identifier in enumerate(_GENERATIONS, start = 1)),
+    )
+
+    version_groups = []
+    versions = []
+    for group_id, (identifier, generation_id, group_versions) in enumerate(_VERSION_GROUPS, start = 1):
+        version_groups.append((group_id, identifier, generation_id, group_id))
+        versions.extend((len(versions) + 1, group_id, version) for version in group_versions)
+
+    _write_csv(csv_dir, 'version_groups', ['id', 'identifier', 'generation_id', 'order'], version_groups)
+    _write_csv(csv_dir, 'versions', ['id', 'version_group_id', 'identifier'], versions)
+
+    _write_csv(
+        csv_dir, 'types', ['id', 'identifier', 'generation_id', 'damage_class_id'],
+        [
+            *((i, identifier, 1 + (i > 15) + (i > 17), '' if i > 18 else 2 + (i > 9)) for i, identifier in enumerate(_TYPES, start = 1)),
+            (10001, 'unknown', 2, ''),
+            (10002, 'shadow', 3, ''),
+        ],
+    )
+    _write_csv(
+        csv_dir, 'growth_rates', ['id', 'identifier', 'formula'],
+        ((i, identifier, formula) for i, (identifier, formula) in enumerate(_GROWTH_RATES, start = 1)),
+    )
+    _write_csv(
+        csv_dir, 'item_categories', ['id', 'pocket_id', 'identifier'],
+        ((i, rng.randint(1, _POCKET_COUNT), f'category-{i}') for i in range(1, _ITEM_CATEGORY_COUNT + 1)),
+    )
+    _write_csv(
+        csv_dir, 'items', ['id', 'identifier', 'category_id', 'cost', 'fling_power', 'fling_effect_id'],
+        (
+            (
+                i, f'item-{i}', rng.randint(1, _ITEM_CATEGORY_COUNT), rng.randrange(0, 100000, 50),
+                _optional(rng, rng.choice([10, 30, 50, 80, 130]), 0.4), _optional(rng, rng.randint(1, 7), 0.1),
+            )
+            for i in range(1, item_count + 1)
+        ),
+    )
+    _write_csv(
+        csv_dir, 'evolution_chains', ['id', 'baby_trigger_item_id'],
+        ((i, _optional(rng, rng.randint(1, item_count), 0.02)) for i in range(1, chain_count + 1)),
+    )
+
+    species = []
+    for i in range(1, species_count + 1):
+        chain_id = min(chain_count, (i - 1) * chain_count // species_count + 1)
+        evolves_from = i - 1 if i > 1 and species[-1][4] == chain_id and rng.random() < 0.5 else ''
+
+        species.append((
+            i, f'species-{i}', min(len(_GENERATIONS), (i - 1) * len(_GENERATIONS) // species_count + 1),
+            evolves_from, chain_id, rng.randint(1, 10), rng.randint(1, 14), _optional(rng, rng.randint(1, 9), 0.4),
+            rng.choice([-1, 0, 1, 2, 4, 6, 8]), rng.choice([3, 45, 90, 120, 190, 255]), rng.choice([0, 35, 50, 70]),
+            int(rng.random() < 0.02), rng.choice([5, 10, 15, 20, 40, 120]), int(rng.random() < 0.1),
+            rng.randint(1, len(_GROWTH_RATES)), int(rng.random() < 0.03), int(rng.random() < 0.07),
+            int(rng.random() < 0.02), i, _optional(rng, i, 0.2),
+        ))
+
+    _write_csv(
+        csv_dir, 'pokemon_species',
+        [
+            'id', 'identifier', 'generation_id', 'evolves_from_species_id', 'evolution_chain_id', 'color_id',
+            'shape_id', 'habitat_id', 'gender_rate', 'capture_rate', 'base_happiness', 'is_baby', 'hatch_counter',
+            'has_gender_differences', 'growth_rate_id', 'forms_switchable', 'is_legendary', 'is_mythical', 'order',
+            'conquest_order',
+        ],
+        species,
+    )
+
+    form_id_offset = _form_id_offset(scale)
+    pokemon_ids = [*range(1, species_count + 1), *range(form_id_offset + 1, form_id_offset + form_count + 1)]
+    _write_csv(
+        csv_dir, 'pokemon', ['id', 'identifier', 'species_id', 'height', 'weight', 'base_experience', 'order', 'is_default'],
+        (
+            (
+                pokemon_id, f'pokemon-{pokemon_id}', pokemon_id if pokemon_id <= species_count else rng.randint(1, species_count),
+                rng.randint(1, 200), rng.randint(1, 9999), rng.randint(36, 608), order,
+                int(pokemon_id <= species_count),
+            )
+            for order, pokemon_id in enumerate(pokemon_ids, start = 1)
+        ),
+    )
+
+    pokemon_types = []
+    for pokemon_id in pokemon_ids:
+        slots = rng.sample(range(1, len(_TYPES)), 2 if rng.random() < 0.5 else 1)
+        pokemon_types.extend((pokemon_id, type_id, slot) for slot, type_id in enumerate(slots, start = 1))
+
+    _write_csv(csv_dir, 'pokemon_types', ['pokemon_id', 'type_id', 'slot'], pokemon_types)
+
+    return pokemon_ids
+
+
+def generate_sprites(sprite_dir, pokemon_ids, form_id_offset = _FORM_ID_OFFSET, seed = _SEED):
+    rng = random.Random(seed)
+    base_dir = sprite_dir / 'pokemon'
+
+    # A handful of distinct payloads per format keeps generation fast while leaving duplicates around like upstream
+    payloads = {
+        '.png': [_png_bytes(rng = rng, size = _SPRITE_SIZE) for _ in range(8)],
+        '.gif': [_gif_bytes(rng = rng, size = _SPRITE_SIZE, frames = _ANIMATED_FRAMES) for _ in range(4)],
+        '.svg': [_svg_bytes(rng = rng, size = _SPRITE_SIZE) for _ in range(4)],
+    }
+
+    file_count = 0
+    for dir_name, share in _SPRITE_DIRS:
+        directory = base_dir / dir_name
+        directory.mkdir(parents = True, exist_ok = True)
+
+        if 'dream-world' in dir_name:
+            suffix = '.svg'
+        elif 'animated' in dir_name or 'showdown' in dir_name:
+            suffix = '.gif'
+        else:
+            suffix = '.png'
+
+        for pokemon_id in pokemon_ids:
+            if rng.random() >= share:
+                continue
+
+            for name in _sprite_names(pokemon_id = pokemon_id, form_id_offset = form_id_offset):
+                (directory / f'{name}{suffix}').write_bytes(rng.choice(payloads[suffix]))
+                file_count += 1
+
+        # Upstream keeps placeholders next to the real sprites
+        (directory / f'0{suffix}').write_bytes(payloads[suffix][0])
+        (directory / f'substitute{suffix}').write_bytes(payloads[suffix][0])
+
+    return file_count
+
+
+def ensure_fixtures(root_dir, scale, seed = _SEED):
+    fixture_dir = pathlib.Path(root_dir) / f'scale-{scale}'
+    marker = fixture_dir / '.complete'
+
+    csv_dir = fixture_dir / 'csv'
+    sprite_dir = fixture_dir / 'sprites'
+
+    stamp = f'{_FIXTURE_VERSION} {seed}\n'
+
+    if not marker.exists() or marker.read_text(encoding = 'utf-8') != stamp:
+        shutil.rmtree(fixture_dir, ignore_errors = True)
+
+        pokemon_ids = generate_csvs(csv_dir = csv_dir, scale = scale, seed = seed)
+        generate_sprites(
+            sprite_dir = sprite_dir,
+            pokemon_ids = pokemon_ids,
+            form_id_offset = _form_id_offset(scale),
+            seed = seed,
+        )
+        marker.write_text(stamp, encoding = 'utf-8')
+
+    return csv_dir, sprite_dir
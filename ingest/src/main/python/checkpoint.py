@@ -0,0 +1,157 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import contextlib
+import hashlib
+from collections import namedtuple
+from logger import debug, info, warning, error, critical
+from manifest import FORCE_RELOAD
+from metrics import measure
+
+# Classes
+
+# inputs returns what the stage reads, block runs it and returns whether it completed
+# outputs optionally returns what it leaves behind, a stage whose outputs changed since it completed runs again
+Stage = namedtuple('Stage', ['name', 'inputs', 'block', 'outputs'], defaults = (None,))
+
+
+# Utilities
+
+def _hash_inputs(inputs):
+    digest = hashlib.sha256()
+
+    for item in inputs:
+        digest.update(repr(item).encode('utf-8'))
+        digest.update(b'\n')
+
+    return digest.hexdigest()
+
+
+def _fingerprint(stage, inputs):
+    return _hash_inputs([*inputs, *(stage.outputs() if stage.outputs is not None else ())])
+
+
+def _load_checkpoints(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT stage, input_hash FROM ingest_checkpoint;
+            """
+        )
+
+        return dict(cur.fetchall())
+
+
+def _clear_checkpoints(conn, stage_names):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM ingest_checkpoint WHERE stage = ANY(%s);
+            """,
+            (stage_names,),
+        )
+
+
+def _record_checkpoint(conn, stage_name, input_hash):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO ingest_checkpoint (stage, input_hash) VALUES (%s, %s)
+            ON CONFLICT (stage) DO UPDATE SET input_hash = EXCLUDED.input_hash, completed_at = now();
+            """,
+            (stage_name, input_hash),
+        )
+
+
+# Functions
+
+@contextlib.contextmanager
+def savepoint(conn, name):
+    with conn.cursor() as cur:
+        cur.execute(f'SAVEPOINT {name};')
+
+    try:
+        yield
+    except Exception:
+        with conn.cursor() as cur:
+            cur.execute(f'ROLLBACK TO SAVEPOINT {name};')
+        raise
+
+    with conn.cursor() as cur:
+        cur.execute(f'RELEASE SAVEPOINT {name};')
+
+
+def checkpoint_hashes(conn, stage_names):
+    checkpoints = _load_checkpoints(conn)
+    return [(stage_name, checkpoints.get(stage_name)) for stage_name in stage_names]
+
+
+def run_stages(conn, stages, resume = True):
+    # Without resuming every stage runs, its checkpoint is still recorded for later runs to resume from
+    checkpoints = _load_checkpoints(conn) if resume else { }
+    conn.commit()
+
+    all_completed = True
+    resuming = True
+    for position, stage in enumerate(stages):
+        try:
+            inputs = list(stage.inputs())
+            input_hash = _fingerprint(stage, inputs)
+        except Exception as e:
+            warning(f'Could not fingerprint the inputs of {stage.name}, running it without a checkpoint: {e}')
+            input_hash = None
+
+        if resuming and not FORCE_RELOAD and input_hash is not None and checkpoints.get(stage.name) == input_hash:
+            info(f'Skipping {stage.name}, an earlier run completed it against the same inputs')
+            continue
+
+        # Everything from here on runs again, a crash must not leave a later stage looking complete
+        if resuming:
+            _clear_checkpoints(conn = conn, stage_names = [later.name for later in stages[position:]])
+            conn.commit()
+            resuming = False
+
+        info(f'Running {stage.name}...')
+        try:
+            with measure('stage', stage.name):
+                completed = stage.block()
+        except Exception as e:
+            error(f'Stage {stage.name} failed: {e}')
+            completed = False
+
+        if not completed:
+            conn.rollback()
+            warning(f'{stage.name} did not complete, the next run resumes from it')
+            all_completed = False
+            continue
+
+        # Taken again for the outputs the stage just produced, the next run compares against those
+        if input_hash is not None and stage.outputs is not None:
+            try:
+                input_hash = _fingerprint(stage, inputs)
+            except Exception as e:
+                warning(f'Could not fingerprint the outputs of {stage.name}, not recording a checkpoint: {e}')
+                input_hash = None
+
+        if input_hash is not None:
+            _record_checkpoint(conn = conn, stage_name = stage.name, input_hash = input_hash)
+            conn.commit()
+
+        info(f'Done running {stage.name}')
+
+    return all_completed
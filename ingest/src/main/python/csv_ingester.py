@@ -16,17 +16,41 @@
 #  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
 #  to permit persons to whom the Software is furnished to do so.
 #
+import contextlib
 import csv
+import functools
 import io
+import itertools
 import os
 import pathlib
+import time
 from logger import debug, info, warning, error, critical
-from csv_utils import ingest_csv
+from csv_utils import ingest_csv, finish_hash_merges, RowStream, ChunkStream, COPY_FORMAT
+from manifest import check_manifest, record_manifest
+from metrics import measure, record
+from frame_utils import read_csv_frame, enum_column, columns_to_csv_text
+from table_spec import (
+    Column, TEXT, INT, FLAG, enum, lookup, read_header, find_missing_sources, text_sources, compile_row_mapper,
+    compile_frame_mapper,
+)
+from scheduler import Task, run_task_graph, dependency_order
+from pipeline import ChunkPipeline
 
 # Constants
 
 _CSV_DIR = os.getenv('POKEAPI_CSV_DIR', 'csv')
 
+# 'columnar' converts whole columns with pandas, 'rows' runs the compiled row mappers over csv.reader
+# Only 'rows' hands rows to a binary COPY, columnar output is CSV text, so the default follows COPY_FORMAT
+_TRANSFORM_ENGINE = os.getenv('CSV_TRANSFORM_ENGINE', 'rows' if COPY_FORMAT == 'binary' else 'columnar').lower()
+
+# Rows the columnar engine parses and renders at a time, COPY streams one chunk while the next is converted
+_COLUMNAR_CHUNK_ROWS = int(os.getenv('CSV_COLUMNAR_CHUNK_ROWS', 50000))
+
+# Parse mapped CSVs on producer threads ahead of their COPY, see _start_pipelines
+_PIPELINE = os.getenv('CSV_PIPELINE', 'false').lower() == 'true'
+_PIPELINE_CHUNK_ROWS = int(os.getenv('CSV_PIPELINE_CHUNK_ROWS', 50000))
+
 # Enum Maps
 
 _SIMPLE_CSVS = {
@@ -37,6 +61,23 @@ _SIMPLE_CSVS = {
     'version_group'  : 'version_groups',
 }
 
+# CSV files read by a mapper next to its own source file, these are part of the table's manifest as well
+_EXTRA_INPUTS = {
+    'pokemon': ['pokemon_types'],
+}
+
+# Mirrors the foreign keys in 03_constraint so referenced tables are loaded before the tables pointing at them
+_TABLE_DEPENDENCIES = {
+    'evolution_chain': ['item'],
+    'generation'     : ['region'],
+    'version'        : ['version_group'],
+    'version_group'  : ['generation'],
+    'pokemon'        : ['species'],
+    'type_metadata'  : ['generation'],
+    'item'           : ['item_category'],
+    'species'        : ['generation', 'evolution_chain'],
+}
+
 _TYPE_ID_TO_ENUM = {
     '1' : 'Normal',
     '2' : 'Fighting',
@@ -142,13 +183,36 @@ _HABITAT_ID_TO_ENUM = {
 
 # Utilities
 
-def _run_ingest(conn, table_name, file_name, block):
-    try:
+def _check_manifest(conn, table_name, file_name, mapper_version):
+    return check_manifest(
+        conn = conn,
+        table_name = table_name,
+        paths = [_get_csv_path(name) for name in [file_name, *_EXTRA_INPUTS.get(table_name, [])]],
+        mapper_version = mapper_version,
+    )
+
+
+def _run_ingest(conn, table_name, file_name, block, mapper_version, manifest = None):
+    unchanged, fingerprints = manifest or _check_manifest(
+        conn = conn,
+        table_name = table_name,
+        file_name = file_name,
+        mapper_version = mapper_version,
+    )
+
+    if unchanged:
+        info(f'Skipping {table_name}, inputs unchanged since last ingest')
+    else:
         info(f'Ingesting {table_name}')
         block(conn, table_name, file_name)
         info(f'Done ingesting {table_name}')
-    except Exception as e:
-        error(f'Failed to ingest {table_name}: {e}')
+
+    record_manifest(
+        conn = conn,
+        table_name = table_name,
+        fingerprints = fingerprints,
+        mapper_version = mapper_version,
+    )
 
 
 def _get_csv_path(name):
@@ -160,26 +224,127 @@ def _ingest_simple_csv(conn, table_name, file_name):
         ingest_csv(conn = conn, csv_source = f, table_name = table_name)
 
 
-def _map_csv(file_name, headers, mapper):
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(headers)
+def _itr_mapped_rows(table_name, file_name, columns):
+    path = _get_csv_path(file_name)
 
-    with _get_csv_path(file_name).open('r', encoding = 'utf-8') as f:
-        reader = csv.DictReader(f)
+    # Parsing and mapping happen lazily while COPY pulls rows, so their time is summed up per row
+    parse_metrics = record('parse', table_name)
+    transform_metrics = record('transform', table_name)
+    parse_metrics.bytes = path.stat().st_size
+
+    with path.open('r', encoding = 'utf-8', newline = '') as f:
+        reader = csv.reader(f)
+        mapper = compile_row_mapper(columns = columns, header = next(reader, []))
+
+        start = time.perf_counter()
         for row in reader:
+            parsed = time.perf_counter()
             mapped = mapper(row)
-            writer.writerow(mapped)
+            mapped_at = time.perf_counter()
+
+            parse_metrics.duration += parsed - start
+            transform_metrics.duration += mapped_at - parsed
+            parse_metrics.rows_out += 1
+
+            yield mapped
+            start = time.perf_counter()
+
+        parse_metrics.duration += time.perf_counter() - start
+
+    parse_metrics.rows_in = parse_metrics.rows_out
+    transform_metrics.rows_in = parse_metrics.rows_out
+    transform_metrics.rows_out = parse_metrics.rows_out
+
 
-    buffer.seek(0)
-    return buffer
+def _render_header(columns):
+    header = io.StringIO()
+    csv.writer(header, lineterminator = '\n').writerow([column.target for column in columns])
+
+    return header.getvalue()
+
+
+def _map_frame(table_name, file_name, columns):
+    # Converted a chunk at a time while COPY pulls, only one chunk of the file is held in memory
+    return ChunkStream(
+        itertools.chain(
+            [_render_header(columns)],
+            _itr_frame_chunks(
+                table_name = table_name,
+                file_name = file_name,
+                columns = columns,
+                chunk_rows = _COLUMNAR_CHUNK_ROWS,
+            ),
+        ),
+    )
+
+
+def _map_csv(table_name, file_name, columns):
+    if _TRANSFORM_ENGINE == 'columnar':
+        return _map_frame(table_name = table_name, file_name = file_name, columns = columns)
+
+    return RowStream(
+        headers = [column.target for column in columns],
+        rows = _itr_mapped_rows(table_name = table_name, file_name = file_name, columns = columns),
+    )
+
+
+def _itr_frame_chunks(table_name, file_name, columns, chunk_rows = _PIPELINE_CHUNK_ROWS):
+    path = _get_csv_path(file_name)
+    headers = [column.target for column in columns]
+    mapper = compile_frame_mapper(columns)
+
+    parse_metrics = record('parse', table_name)
+    transform_metrics = record('transform', table_name)
+    parse_metrics.bytes = path.stat().st_size
+
+    with read_csv_frame(path, text_columns = text_sources(columns), chunksize = chunk_rows) as frames:
+        start = time.perf_counter()
+        for frame in frames:
+            parsed = time.perf_counter()
+            chunk = columns_to_csv_text(headers = headers, columns = mapper(frame), header = False)
+            mapped_at = time.perf_counter()
+
+            parse_metrics.duration += parsed - start
+            transform_metrics.duration += mapped_at - parsed
+            parse_metrics.rows_out += len(frame)
+
+            yield chunk
+            start = time.perf_counter()
+
+    parse_metrics.rows_in = parse_metrics.rows_out
+    transform_metrics.rows_in = parse_metrics.rows_out
+    transform_metrics.rows_out = parse_metrics.rows_out
+
+
+def _itr_row_chunks(table_name, file_name, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator = '\n')
+
+    rows = _itr_mapped_rows(table_name = table_name, file_name = file_name, columns = columns)
+    for chunk in iter(lambda: list(itertools.islice(rows, _PIPELINE_CHUNK_ROWS)), []):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _itr_csv_chunks(table_name, file_name):
+    columns = _load_columns(table_name)
+
+    yield _render_header(columns)
+
+    if _TRANSFORM_ENGINE == 'columnar':
+        yield from _itr_frame_chunks(table_name = table_name, file_name = file_name, columns = columns)
+    else:
+        yield from _itr_row_chunks(table_name = table_name, file_name = file_name, columns = columns)
 
 
 def _load_static_type_lookup():
     pokemon_type_map = { }
     with _get_csv_path('pokemon_types').open('r', encoding = 'utf-8') as f:
         for row in csv.DictReader(f):
-            pid = row['pokemon_id']
+            pid = int(row['pokemon_id'])
             slot = int(row['slot'])
             type_name = _TYPE_ID_TO_ENUM[row['type_id']]
             pokemon_type_map.setdefault(pid, []).append((slot, type_name))
@@ -194,188 +359,264 @@ def _load_static_type_lookup():
     return result
 
 
-def _int_or_none(value):
-    return int(value) if value not in ('', '\\N', None) else None
+def _load_frame_type_lookup():
+    types = read_csv_frame(_get_csv_path('pokemon_types'))
+    types = types.assign(type_name = enum_column(types['type_id'], _TYPE_ID_TO_ENUM)).sort_values(['pokemon_id', 'slot'])
 
+    rank = types.groupby('pokemon_id').cumcount()
+    primary = types[rank == 0]
+    secondary = types[rank == 1]
+    primary = dict(zip(primary['pokemon_id'].tolist(), primary['type_name'].tolist()))
+    secondary = dict(zip(secondary['pokemon_id'].tolist(), secondary['type_name'].tolist()))
 
-# Ingestions
+    return { pid: (type_name, secondary.get(pid)) for pid, type_name in primary.items() }
 
-def _ingest_pokemon(conn, table_name, file_name):
-    type_lookup = _load_static_type_lookup()
 
-    buffer = _map_csv(
-        file_name = file_name,
-        headers = [
-            'id', 'name', 'primaryType', 'secondaryType', 'species_id', 'height_dm', 'weight_hg',
-            'base_experience', 'natural_order', 'is_default',
-        ],
-        mapper = lambda row:
-        (
-            int(row['id']),  # id
-            row['identifier'],  # name
-            *(type_lookup.get(row['id'], (None, None))),  # primaryType, secondaryType
-            int(row['species_id']),  # species_id
-            int(row['height']),  # height_dm
-            int(row['weight']),  # weight_hg
-            int(row['base_experience']),  # base_experience
-            _int_or_none(row['order']),  # natural_order
-            row['is_default'] == '1',  # is_default
-        ),
-    )
+def _load_columns(table_name):
+    if table_name != 'pokemon':
+        return _MAPPED_COLUMNS[table_name]
 
-    ingest_csv(conn = conn, csv_source = buffer, table_name = table_name)
+    type_lookup = _load_frame_type_lookup() if _TRANSFORM_ENGINE == 'columnar' else _load_static_type_lookup()
 
+    return _pokemon_columns(type_lookup)
 
-def _ingest_type_metadata(conn, table_name, file_name):
-    buffer = _map_csv(
-        file_name = file_name,
-        headers = ['ptype', 'generation_id', 'damage_class'],
-        mapper = lambda row:
-        (
-            _TYPE_ID_TO_ENUM[row['id']],
-            int(row['generation_id']),
-            _DAMAGE_CLASS_ID_TO_ENUM.get(row['damage_class_id'] or None),
-        ),
-    )
 
-    ingest_csv(conn = conn, csv_source = buffer, table_name = table_name)
+def _pokemon_columns(type_lookup):
+    return [
+        Column('id', 'id', INT),
+        Column('name', 'identifier', TEXT),
+        Column('primaryType', 'id', lookup({ pid: types[0] for pid, types in type_lookup.items() })),
+        Column('secondaryType', 'id', lookup({ pid: types[1] for pid, types in type_lookup.items() })),
+        Column('species_id', 'species_id', INT),
+        Column('height_dm', 'height', INT),
+        Column('weight_hg', 'weight', INT),
+        Column('base_experience', 'base_experience', INT),
+        Column('natural_order', 'order', INT, nullable = True),
+        Column('is_default', 'is_default', FLAG),
+    ]
 
 
-def _ingest_growth_rate_metadata(conn, table_name, file_name):
-    # id,identifier,formula
-    buffer = _map_csv(
-        file_name = file_name,
-        headers = ['rate', 'formula'],
-        mapper = lambda row:
-        (
-            _GROWTH_RATE_ID_TO_ENUM[row['id']],
-            row['formula'],
-        ),
-    )
+def _validate_source_headers():
+    problems = []
 
-    ingest_csv(conn = conn, csv_source = buffer, table_name = table_name)
+    for table_name, columns in _MAPPED_COLUMNS.items():
+        path = _get_csv_path(_MAPPED_FILES[table_name])
 
+        if not path.exists():
+            continue
 
-def _ingest_item_categories(conn, table_name, file_name):
-    buffer = _map_csv(
-        file_name = file_name,
-        headers = ['id', 'pocket', 'name'],
-        mapper = lambda row:
-        (
-            int(row['id']),
-            _ITEM_POCKET_ID_TO_ENUM[row['pocket_id']],
-            row['identifier'],
-        ),
-    )
+        missing = find_missing_sources(columns = columns, header = read_header(path))
+        if missing:
+            problems.append(f'{path.name} is missing {", ".join(missing)} for {table_name}')
 
-    ingest_csv(conn = conn, csv_source = buffer, table_name = table_name)
+    if problems:
+        raise ValueError(f'CSV headers do not match the table specs: {"; ".join(problems)}')
 
 
-def _ingest_items(conn, table_name, file_name):
-    buffer = _map_csv(
-        file_name = file_name,
-        headers = ['id', 'name', 'category_id', 'cost', 'fling_power', 'fling_effect'],
-        mapper = lambda row:
-        (
-            int(row['id']),
-            row['identifier'],
-            int(row['category_id']),
-            int(row['cost']),
-            _int_or_none(row['fling_power']),
-            _FLING_EFFECT_ID_TO_ENUM.get(row['fling_effect_id'] or None),
-        ),
-    )
+# Ingestions
+
+def _ingest_mapped(conn, table_name, file_name, columns):
+    buffer = _map_csv(table_name = table_name, file_name = file_name, columns = columns)
 
     ingest_csv(conn = conn, csv_source = buffer, table_name = table_name)
 
 
-def _ingest_species(conn, table_name, file_name):
-    buffer = _map_csv(
-        file_name = file_name,
-        headers = [
-            'id', 'name', 'generation_id', 'evolves_from', 'evolution_chain_id', 'color', 'shape', 'habitat',
-            'gender_rate', 'capture_rate', 'base_happiness', 'is_baby', 'hatch_counter', 'has_gender_difference',
-            'growth_rate', 'forms_switchable', 'is_legendary', 'is_mythical', 'natural_order', 'conquest_order',
-        ],
-        mapper = lambda row:
-        (
-            int(row['id']),
-            row['identifier'],
-            int(row['generation_id']),
-            _int_or_none(row['evolves_from_species_id']),
-            int(row['evolution_chain_id']),
-            _COLOR_ID_TO_ENUM[row['color_id']],
-            _SHAPE_ID_TO_ENUM[row['shape_id']],
-            _HABITAT_ID_TO_ENUM.get(row['habitat_id'] or None),
-            int(row['gender_rate']),
-            int(row['capture_rate']),
-            int(row['base_happiness']),
-            row['is_baby'] == '1',
-            int(row['hatch_counter']),
-            row['has_gender_differences'] == '1',
-            _GROWTH_RATE_ID_TO_ENUM[row['growth_rate_id']],
-            row['forms_switchable'] == '1',
-            row['is_legendary'] == '1',
-            row['is_mythical'] == '1',
-            int(row['order']),
-            _int_or_none(row['conquest_order']),
-        ),
-    )
+def _ingest_pokemon(conn, table_name, file_name):
+    _ingest_mapped(conn = conn, table_name = table_name, file_name = file_name, columns = _load_columns(table_name))
 
-    ingest_csv(conn = conn, csv_source = buffer, table_name = table_name)
 
+@contextlib.contextmanager
+def _open_payload(table_name, file_name):
+    if table_name in _SIMPLE_CSVS:
+        with _get_csv_path(file_name).open('r', encoding = 'utf-8') as f:
+            yield f
+    else:
+        yield _map_csv(table_name = table_name, file_name = file_name, columns = _load_columns(table_name))
 
-# Main function
 
-def ingest_csv_files(conn):
-    for table_name, file_name in _SIMPLE_CSVS.items():
-        _run_ingest(
-            conn = conn,
-            table_name = table_name,
-            file_name = file_name,
-            block = _ingest_simple_csv,
+def _ingest_pipelined(conn, table_name, file_name, pipeline):
+    try:
+        ingest_csv(conn = conn, csv_source = pipeline.reader(), table_name = table_name)
+    finally:
+        pipeline.cancel()
+
+
+# Table Specs
+
+_MAPPED_FILES = {
+    'pokemon'        : 'pokemon',
+    'type_metadata'  : 'types',
+    'growth_metadata': 'growth_rates',
+    'item_category'  : 'item_categories',
+    'item'           : 'items',
+    'species'        : 'pokemon_species',
+}
+
+# Target columns in table order, each read from a source CSV column through a converter
+_MAPPED_COLUMNS = {
+    'pokemon'        : _pokemon_columns(type_lookup = { }),
+    'type_metadata'  : [
+        Column('ptype', 'id', enum(_TYPE_ID_TO_ENUM)),
+        Column('generation_id', 'generation_id', INT),
+        Column('damage_class', 'damage_class_id', enum(_DAMAGE_CLASS_ID_TO_ENUM), nullable = True),
+    ],
+    'growth_metadata': [
+        Column('rate', 'id', enum(_GROWTH_RATE_ID_TO_ENUM)),
+        Column('formula', 'formula', TEXT),
+    ],
+    'item_category'  : [
+        Column('id', 'id', INT),
+        Column('pocket', 'pocket_id', enum(_ITEM_POCKET_ID_TO_ENUM)),
+        Column('name', 'identifier', TEXT),
+    ],
+    'item'           : [
+        Column('id', 'id', INT),
+        Column('name', 'identifier', TEXT),
+        Column('category_id', 'category_id', INT),
+        Column('cost', 'cost', INT),
+        Column('fling_power', 'fling_power', INT, nullable = True),
+        Column('fling_effect', 'fling_effect_id', enum(_FLING_EFFECT_ID_TO_ENUM), nullable = True),
+    ],
+    'species'        : [
+        Column('id', 'id', INT),
+        Column('name', 'identifier', TEXT),
+        Column('generation_id', 'generation_id', INT),
+        Column('evolves_from', 'evolves_from_species_id', INT, nullable = True),
+        Column('evolution_chain_id', 'evolution_chain_id', INT),
+        Column('color', 'color_id', enum(_COLOR_ID_TO_ENUM)),
+        Column('shape', 'shape_id', enum(_SHAPE_ID_TO_ENUM)),
+        Column('habitat', 'habitat_id', enum(_HABITAT_ID_TO_ENUM), nullable = True),
+        Column('gender_rate', 'gender_rate', INT),
+        Column('capture_rate', 'capture_rate', INT),
+        Column('base_happiness', 'base_happiness', INT),
+        Column('is_baby', 'is_baby', FLAG),
+        Column('hatch_counter', 'hatch_counter', INT),
+        Column('has_gender_difference', 'has_gender_differences', FLAG),
+        Column('growth_rate', 'growth_rate_id', enum(_GROWTH_RATE_ID_TO_ENUM)),
+        Column('forms_switchable', 'forms_switchable', FLAG),
+        Column('is_legendary', 'is_legendary', FLAG),
+        Column('is_mythical', 'is_mythical', FLAG),
+        Column('natural_order', 'order', INT),
+        Column('conquest_order', 'conquest_order', INT, nullable = True),
+    ],
+}
+
+# Bump a mapper version whenever its mapping changes so unchanged source files are still reloaded
+_INGESTIONS = [
+    *((table_name, file_name, _ingest_simple_csv, 1) for table_name, file_name in _SIMPLE_CSVS.items()),
+    ('pokemon', 'pokemon', _ingest_pokemon, 1),
+    *(
+        (table_name, _MAPPED_FILES[table_name], functools.partial(_ingest_mapped, columns = columns), 1)
+        for table_name, columns in _MAPPED_COLUMNS.items() if table_name != 'pokemon'
+    ),
+]
+
+
+def _precheck_manifests(pool):
+    conn = pool.getconn()
+    manifests = { }
+
+    try:
+        for table_name, file_name, _, mapper_version in _INGESTIONS:
+            try:
+                manifests[table_name] = _check_manifest(
+                    conn = conn,
+                    table_name = table_name,
+                    file_name = file_name,
+                    mapper_version = mapper_version,
+                )
+            except Exception as e:
+                # Left to the table's own task, which checks again and reports the failure where it belongs
+                warning(f'Could not check the manifest of {table_name} ahead of time: {e}')
+                conn.rollback()
+
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+    return manifests
+
+
+def _start_pipelines(manifests):
+    # Tables only wait on their dependencies for the COPY, so their parse starts right away and fills the queue
+    return {
+        table_name: ChunkPipeline(
+            name = table_name,
+            produce = functools.partial(_itr_csv_chunks, table_name = table_name, file_name = file_name),
+        ).start()
+        for table_name, file_name, _, _ in _INGESTIONS
+        if table_name in _MAPPED_FILES and table_name in manifests and not manifests[table_name][0]
+    }
+
+
+# Functions
+
+def csv_inputs():
+    for table_name, file_name, _, mapper_version in _INGESTIONS:
+        for name in [file_name, *_EXTRA_INPUTS.get(table_name, [])]:
+            stat = os.stat(_get_csv_path(name))
+            yield table_name, name, stat.st_size, stat.st_mtime, mapper_version
+
+
+def iter_csv_payloads():
+    _validate_source_headers()
+
+    for table_name, file_name, _, _ in _INGESTIONS:
+        yield (
+            table_name,
+            functools.partial(_open_payload, table_name = table_name, file_name = file_name),
+            _TABLE_DEPENDENCIES.get(table_name, []),
         )
 
-    _run_ingest(
-        conn = conn,
-        table_name = 'pokemon',
-        file_name = 'pokemon',
-        block = _ingest_pokemon,
-    )
 
-    _run_ingest(
-        conn = conn,
-        table_name = 'type_metadata',
-        file_name = 'types',
-        block = _ingest_type_metadata,
-    )
+# Main function
 
-    _run_ingest(
-        conn = conn,
-        table_name = 'growth_metadata',
-        file_name = 'growth_rates',
-        block = _ingest_growth_rate_metadata,
-    )
+def ingest_csv_files(pool):
+    _validate_source_headers()
 
-    _run_ingest(
-        conn = conn,
-        table_name = 'item_category',
-        file_name = 'item_categories',
-        block = _ingest_item_categories,
-    )
+    if COPY_FORMAT == 'binary' and (_TRANSFORM_ENGINE == 'columnar' or _PIPELINE):
+        warning(
+            'COPY_FORMAT=binary only applies to mapped tables on the rows engine without CSV_PIPELINE, '
+            f'with CSV_TRANSFORM_ENGINE={_TRANSFORM_ENGINE} and CSV_PIPELINE={str(_PIPELINE).lower()} '
+            'they are copied as CSV text'
+        )
 
-    _run_ingest(
-        conn = conn,
-        table_name = 'item',
-        file_name = 'items',
-        block = _ingest_items,
-    )
+    manifests = _precheck_manifests(pool) if _PIPELINE else { }
+    pipelines = _start_pipelines(manifests)
+
+    tasks = [
+        Task(
+            name = table_name,
+            block = functools.partial(
+                _run_ingest,
+                table_name = table_name,
+                file_name = file_name,
+                block = (
+                    functools.partial(_ingest_pipelined, pipeline = pipelines[table_name])
+                    if table_name in pipelines else block
+                ),
+                mapper_version = mapper_version,
+                manifest = manifests.get(table_name),
+            ),
+            depends_on = _TABLE_DEPENDENCIES.get(table_name, []),
+        )
+        for table_name, file_name, block, mapper_version in _INGESTIONS
+    ]
 
-    _run_ingest(
-        conn = conn,
-        table_name = 'species',
-        file_name = 'pokemon_species',
-        block = _ingest_species,
-    )
+    try:
+        # Every table commits or rolls back on its own, a failed one no longer aborts the tables after it
+        failed = run_task_graph(pool = pool, tasks = tasks, commit_each = True)
+    finally:
+        # Stops producers whose table never got to its COPY, e.g. after a failed manifest check
+        for pipeline in pipelines.values():
+            pipeline.cancel()
+
+    # A table that failed to merge may still reference rows missing from the other sources, those are kept this run
+    conn = pool.getconn()
+    try:
+        finish_hash_merges(conn = conn, table_names = dependency_order(tasks), delete_missing = not failed)
+    finally:
+        pool.putconn(conn)
+
+    return not failed
 
-    conn.commit()
@@ -16,53 +16,581 @@
 #  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
 #  to permit persons to whom the Software is furnished to do so.
 #
+import csv
+import io
+import os
+import struct
+from psycopg2 import errors
 from logger import debug, info, warning, error, critical
+from metrics import measure, CountingReader
+from checkpoint import savepoint
+
+# Constants
+
+_COPY_CHUNK_SIZE = int(os.getenv('COPY_CHUNK_SIZE', 64 * 1024))
+
+COPY_FORMAT = os.getenv('COPY_FORMAT', 'csv').lower()
+
+_BOOTSTRAP = os.getenv('INGEST_BOOTSTRAP', 'false').lower() == 'true'
+_BOOTSTRAP_UNLOGGED = os.getenv('INGEST_BOOTSTRAP_UNLOGGED', 'false').lower() == 'true'
+
+_BULK_LOAD_SETTINGS = {
+    'synchronous_commit'  : 'off',
+    'maintenance_work_mem': os.getenv('INGEST_BOOTSTRAP_MAINTENANCE_WORK_MEM', '512MB'),
+}
+
+# Alias of the target table inside a merge, used to compare against EXCLUDED when updating on conflict
+_MERGE_ALIAS = 'target'
+_SOURCE_ALIAS = 'source'
+_REFERENCING_ALIAS = 'referencing'
+
+# 'insert' only adds rows the table is missing, 'hash' also updates changed rows and deletes rows gone from the source
+_MERGE_MODE = os.getenv('INGEST_MERGE_MODE', 'insert').lower()
+
+# Content hash of a row's other columns, kept on tables loaded from complete sources so a merge only touches changes
+_ROW_HASH_COLUMN = 'row_hash'
+
+# Keys a hash merge staged, kept until every table is merged so rows missing from the source are deleted in one pass
+_MERGE_KEYS_PREFIX = 'merge_keys_'
+
+_INT2 = struct.Struct('!h')
+_INT4 = struct.Struct('!i')
+
+_PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + _INT4.pack(0) + _INT4.pack(0)
+_PGCOPY_TRAILER = _INT2.pack(-1)
+_PGCOPY_NULL = _INT4.pack(-1)
+
+
+# Binary Encoders
+
+def _fixed_width_encoder(fmt):
+    packer = struct.Struct(f'!i{fmt}')
+    width = packer.size - _INT4.size
+    return lambda value: packer.pack(width, value)
+
+
+def _encode_bool(value):
+    return b'\x00\x00\x00\x01\x01' if value else b'\x00\x00\x00\x01\x00'
+
+
+def _encode_text(value):
+    encoded = str(value).encode('utf-8')
+    return _INT4.pack(len(encoded)) + encoded
+
+
+_BINARY_ENCODERS = {
+    'int2'   : _fixed_width_encoder('h'),
+    'int4'   : _fixed_width_encoder('i'),
+    'int8'   : _fixed_width_encoder('q'),
+    'float4' : _fixed_width_encoder('f'),
+    'float8' : _fixed_width_encoder('d'),
+    'bool'   : _encode_bool,
+    'text'   : _encode_text,
+    'varchar': _encode_text,
+}
+
+
+# Classes
+
+class RowStream(io.TextIOBase):
+    def __init__(self, headers, rows, chunk_size = _COPY_CHUNK_SIZE):
+        self.headers = headers
+        self.rows = iter(rows)
+        self._chunk_size = chunk_size
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(headers)
+        self._exhausted = False
+
+    def readable(self):
+        return True
+
+    def read(self, size = -1):
+        if size is None or size < 0:
+            size = None
+
+        while not self._exhausted and (size is None or self._buffer.tell() < size):
+            row = next(self.rows, None)
+
+            if row is None:
+                self._exhausted = True
+            else:
+                self._writer.writerow(row)
+
+        data = self._buffer.getvalue()
+        remainder = ''
+
+        if size is not None and len(data) > size:
+            data, remainder = data[:size], data[size:]
+
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(remainder)
+
+        return data
+
+
+class ChunkStream(io.TextIOBase):
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = ''
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size = -1):
+        if size is None or size < 0:
+            data = self._chunk[self._offset:] + ''.join(self._chunks)
+            self._chunk, self._offset = '', 0
+            return data
+
+        # Sliced by offset, cutting the front off a large chunk on every read would copy the rest each time
+        parts = []
+        while size > 0:
+            if self._offset >= len(self._chunk):
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._chunk, self._offset = chunk, 0
+                continue
+
+            part = self._chunk[self._offset:self._offset + size]
+            self._offset += len(part)
+            size -= len(part)
+            parts.append(part)
+
+        return ''.join(parts)
+
+
+class BinaryRowStream(io.RawIOBase):
+    def __init__(self, rows, encoders):
+        self._rows = iter(rows)
+        self._encoders = encoders
+        self._row_header = _INT2.pack(len(encoders))
+        self._buffer = bytearray(_PGCOPY_HEADER)
+        self._exhausted = False
+
+    def readable(self):
+        return True
+
+    def read(self, size = -1):
+        if size is None or size < 0:
+            size = None
+
+        buffer = self._buffer
+        while not self._exhausted and (size is None or len(buffer) < size):
+            row = next(self._rows, None)
+
+            if row is None:
+                buffer += _PGCOPY_TRAILER
+                self._exhausted = True
+            else:
+                buffer += self._row_header
+                for encoder, value in zip(self._encoders, row):
+                    buffer += _PGCOPY_NULL if value is None else encoder(value)
+
+        if size is None or len(buffer) <= size:
+            data = bytes(buffer)
+            buffer.clear()
+        else:
+            data = bytes(buffer[:size])
+            del buffer[:size]
+
+        return data
+
+
+# Utilities
+
+def _read_csv_headers(csv_source):
+    if isinstance(csv_source, RowStream):
+        return csv_source.headers
+
+    csv_source.seek(0)
+    headers = next(csv.reader([csv_source.readline()]))
+    csv_source.seek(0)
+
+    return headers
+
+
+def _load_binary_encoders(cur, table_name, columns):
+    cur.execute(
+        """
+        SELECT a.attname, t.typname, t.typtype
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped;
+        """,
+        (table_name,),
+    )
+    column_types = { name: (type_name, type_type) for name, type_name, type_type in cur.fetchall() }
+
+    encoders = []
+    for column in columns:
+        type_name, type_type = column_types[column.lower()]
+
+        # Enums are sent as their label, the same as text
+        if type_type == 'e':
+            encoders.append(_encode_text)
+        elif type_name in _BINARY_ENCODERS:
+            encoders.append(_BINARY_ENCODERS[type_name])
+        else:
+            raise ValueError(f'No binary COPY encoder for {table_name}.{column} of type {type_name}')
+
+    return encoders
+
+
+def _load_table_columns(cur, table_name):
+    cur.execute(
+        """
+        SELECT a.attname
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum;
+        """,
+        (table_name,),
+    )
+    columns = [name for (name,) in cur.fetchall()]
+
+    # The hash is never part of a source, it is derived from the other columns during the merge
+    return [column for column in columns if column != _ROW_HASH_COLUMN], _ROW_HASH_COLUMN in columns
+
+
+def _load_primary_key(cur, table_name):
+    cur.execute(
+        """
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary
+        ORDER BY array_position(i.indkey::INT2[], a.attnum);
+        """,
+        (table_name,),
+    )
+
+    return [name for (name,) in cur.fetchall()]
+
+
+def _row_hash(alias, columns):
+    return f'md5(ROW({", ".join(f"{alias}.{column}" for column in columns)})::TEXT)::UUID'
+
+
+def _copy_into(cur, into_table_name, table_name, csv_source, columns, has_generated_primary, metrics):
+    if COPY_FORMAT == 'binary' and isinstance(csv_source, RowStream):
+        columns = csv_source.headers
+        source = CountingReader(
+            BinaryRowStream(
+                rows = csv_source.rows,
+                encoders = _load_binary_encoders(cur = cur, table_name = table_name, columns = columns),
+            ),
+        )
+
+        cur.copy_expert(
+            f"""
+            COPY {into_table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary);
+            """,
+            source,
+            size = _COPY_CHUNK_SIZE,
+        )
+    elif has_generated_primary:
+        headers = ', '.join(_read_csv_headers(csv_source))
+        source = CountingReader(csv_source)
+
+        cur.copy_expert(
+            f"""
+            COPY {into_table_name} ({headers}) FROM STDIN WITH CSV HEADER;
+            """,
+            source,
+            size = _COPY_CHUNK_SIZE,
+        )
+    else:
+        source = CountingReader(csv_source)
+
+        # Named so a trailing row hash is left out, the CSV columns still line up by position
+        cur.copy_expert(
+            f"""
+            COPY {into_table_name} ({', '.join(columns)}) FROM STDIN WITH CSV HEADER;
+            """,
+            source,
+            size = _COPY_CHUNK_SIZE,
+        )
+
+    metrics.rows_in = cur.rowcount
+    metrics.rows_out = cur.rowcount
+    metrics.bytes = source.bytes
+
+
+def _is_empty(cur, table_name):
+    cur.execute(
+        f"""
+        SELECT NOT EXISTS (SELECT 1 FROM {table_name});
+        """
+    )
+
+    return cur.fetchone()[0]
+
+
+def _has_foreign_keys(cur, table_name):
+    cur.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE contype = 'f' AND (conrelid = %s::regclass OR confrelid = %s::regclass)
+        );
+        """,
+        (table_name, table_name),
+    )
+
+    return cur.fetchone()[0]
+
+
+def _bootstrap(cur, table_name, csv_source, columns, has_generated_primary, metrics):
+    for setting, value in _BULK_LOAD_SETTINGS.items():
+        cur.execute('SELECT set_config(%s, %s, true);', (setting, value))
+
+    # Postgres refuses to switch tables that take part in foreign keys, only fresh schemas qualify
+    unlogged = _BOOTSTRAP_UNLOGGED and not _has_foreign_keys(cur = cur, table_name = table_name)
+
+    if unlogged:
+        cur.execute(f'ALTER TABLE {table_name} SET UNLOGGED;')
+
+    _copy_into(
+        cur = cur,
+        into_table_name = table_name,
+        table_name = table_name,
+        csv_source = csv_source,
+        columns = columns,
+        has_generated_primary = has_generated_primary,
+        metrics = metrics,
+    )
+
+    if unlogged:
+        cur.execute(f'ALTER TABLE {table_name} SET LOGGED;')
+
+    cur.execute(f'ANALYZE {table_name};')
+
+
+def _conflict_clause(conflict_columns, update_columns):
+    if not conflict_columns or not update_columns:
+        return 'ON CONFLICT DO NOTHING'
+
+    assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in update_columns)
+    current = ', '.join(f'{_MERGE_ALIAS}.{column}' for column in update_columns)
+    excluded = ', '.join(f'EXCLUDED.{column}' for column in update_columns)
+
+    return (
+        f'ON CONFLICT ({", ".join(conflict_columns)}) DO UPDATE SET {assignments} '
+        f'WHERE ROW({current}) IS DISTINCT FROM ROW({excluded})'
+    )
+
+
+def _load_nulling_references(cur, table_name):
+    # Foreign keys whose delete rewrites the referencing row, which the hash of that row knows nothing about
+    cur.execute(
+        """
+        SELECT
+            con.conrelid::REGCLASS::TEXT,
+            array_agg(referencing.attname ORDER BY k.position),
+            array_agg(referenced.attname ORDER BY k.position)
+        FROM pg_constraint con
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(referencing, referenced, position)
+        JOIN pg_attribute referencing ON referencing.attrelid = con.conrelid AND referencing.attnum = k.referencing
+        JOIN pg_attribute referenced ON referenced.attrelid = con.confrelid AND referenced.attnum = k.referenced
+        WHERE con.contype = 'f' AND con.confrelid = %s::REGCLASS AND con.confdeltype IN ('n', 'd')
+            AND EXISTS (
+                SELECT 1 FROM pg_attribute a
+                WHERE a.attrelid = con.conrelid AND a.attname = %s AND NOT a.attisdropped
+            )
+        GROUP BY con.oid, con.conrelid;
+        """,
+        (table_name, _ROW_HASH_COLUMN),
+    )
+
+    return cur.fetchall()
+
+
+def _delete_missing_rows(cur, table_name, keys_table_name, metrics):
+    key_columns = _load_primary_key(cur = cur, table_name = table_name)
+    matches = ' AND '.join(f'{_MERGE_ALIAS}.{column} = {_SOURCE_ALIAS}.{column}' for column in key_columns)
+    missing = f'NOT EXISTS (SELECT 1 FROM {keys_table_name} AS {_SOURCE_ALIAS} WHERE {matches})'
+
+    # Rows about to lose their reference get a new hash on the next merge instead of looking unchanged forever
+    for referencing_table_name, referencing_columns, referenced_columns in _load_nulling_references(cur, table_name):
+        references = ' AND '.join(
+            f'{_REFERENCING_ALIAS}.{referencing} = {_MERGE_ALIAS}.{referenced}'
+            for referencing, referenced in zip(referencing_columns, referenced_columns)
+        )
+        cur.execute(
+            f"""
+            UPDATE {referencing_table_name} AS {_REFERENCING_ALIAS} SET {_ROW_HASH_COLUMN} = NULL
+            WHERE EXISTS (SELECT 1 FROM {table_name} AS {_MERGE_ALIAS} WHERE {references} AND {missing});
+            """
+        )
+
+    cur.execute(
+        f"""
+        DELETE FROM {table_name} AS {_MERGE_ALIAS} WHERE {missing};
+        """
+    )
+    metrics.rows_deleted = cur.rowcount
+
+
+def _hash_merge(cur, table_name, tmp_table_name, columns, metrics):
+    key_columns = _load_primary_key(cur = cur, table_name = table_name)
+    if not key_columns:
+        raise ValueError(f'{table_name} has no primary key to merge on')
+
+    matches = ' AND '.join(f'{_MERGE_ALIAS}.{column} = {_SOURCE_ALIAS}.{column}' for column in key_columns)
+    assignments = ', '.join(
+        f'{column} = {_SOURCE_ALIAS}.{column}' for column in columns if column not in key_columns
+    )
+    source_hash = _row_hash(alias = _SOURCE_ALIAS, columns = columns)
+
+    # Only rows whose content changed are rewritten, rows without a hash yet are rewritten once to store theirs
+    cur.execute(
+        f"""
+        UPDATE {table_name} AS {_MERGE_ALIAS}
+        SET {assignments + ', ' if assignments else ''}{_ROW_HASH_COLUMN} = {source_hash}
+        FROM {tmp_table_name} AS {_SOURCE_ALIAS}
+        WHERE {matches} AND {_MERGE_ALIAS}.{_ROW_HASH_COLUMN} IS DISTINCT FROM {source_hash};
+        """
+    )
+    metrics.rows_updated = cur.rowcount
+
+    cur.execute(
+        f"""
+        INSERT INTO {table_name} ({', '.join(columns)}, {_ROW_HASH_COLUMN})
+        SELECT {', '.join(f'{_SOURCE_ALIAS}.{column}' for column in columns)}, {source_hash}
+        FROM {tmp_table_name} AS {_SOURCE_ALIAS}
+        WHERE NOT EXISTS (SELECT 1 FROM {table_name} AS {_MERGE_ALIAS} WHERE {matches});
+        """
+    )
+    metrics.rows_inserted = cur.rowcount
+
+    # Deleting here would run into rows of tables not merged yet that still reference these, see finish_hash_merges
+    cur.execute(
+        f"""
+        CREATE UNLOGGED TABLE {_MERGE_KEYS_PREFIX}{table_name} AS SELECT {', '.join(key_columns)} FROM {tmp_table_name};
+        """
+    )
+
+    metrics.rows_out = metrics.rows_inserted + metrics.rows_updated
+    metrics.rows_unchanged = metrics.rows_in - metrics.rows_out
+
 
 # Functions
 
+def finish_hash_merges(conn, table_names, delete_missing = True):
+    # Referencing tables go first, their rows no longer hold on to the rows deleted after them
+    for table_name in reversed(table_names):
+        keys_table_name = f'{_MERGE_KEYS_PREFIX}{table_name}'
+
+        with conn.cursor() as cur:
+            cur.execute('SELECT to_regclass(%s) IS NOT NULL;', (keys_table_name,))
+            if not cur.fetchone()[0]:
+                continue
+
+            if delete_missing:
+                try:
+                    with measure('delete', table_name) as metrics, savepoint(conn, 'merge_delete'):
+                        _delete_missing_rows(
+                            cur = cur,
+                            table_name = table_name,
+                            keys_table_name = keys_table_name,
+                            metrics = metrics,
+                        )
+                    debug(f'Deleted {metrics.rows_deleted} rows of {table_name} missing from the source')
+                except errors.ForeignKeyViolation as e:
+                    warning(
+                        f'Keeping rows of {table_name} missing from the source, other tables still reference them. '
+                        f'Run with INGEST_FORCE_RELOAD once those are gone to delete them: {e}'
+                    )
+
+            cur.execute(f'DROP TABLE {keys_table_name};')
+
+        conn.commit()
+
 
-def ingest_csv(conn, csv_source, table_name, has_generated_primary = False):
+def ingest_csv(
+    conn,
+    csv_source,
+    table_name,
+    has_generated_primary = False,
+    conflict_columns = None,
+    update_columns = None,
+):
     tmp_table_name = f'tmp_{table_name}'
+    conflict_clause = _conflict_clause(conflict_columns = conflict_columns, update_columns = update_columns)
 
     with conn.cursor() as cur:
+        columns, has_row_hash = _load_table_columns(cur = cur, table_name = table_name)
+
+        # Left behind by a run that stopped before finish_hash_merges, its keys are not this source's
+        if has_row_hash and _MERGE_MODE == 'hash':
+            cur.execute(f'DROP TABLE IF EXISTS {_MERGE_KEYS_PREFIX}{table_name};')
+
+        # Nothing in an empty table can conflict, so skip the staging table and merge entirely
+        if _BOOTSTRAP and _is_empty(cur = cur, table_name = table_name):
+            debug(f'{table_name} is empty, bootstrapping with a direct COPY')
+            with measure('copy', table_name) as metrics:
+                _bootstrap(
+                    cur = cur,
+                    table_name = table_name,
+                    csv_source = csv_source,
+                    columns = columns,
+                    has_generated_primary = has_generated_primary,
+                    metrics = metrics,
+                )
+            return metrics.rows_out
+
         cur.execute(
             f"""
             CREATE TEMP TABLE {tmp_table_name} (LIKE {table_name} INCLUDING ALL);
             """
         )
 
-        if has_generated_primary:
-            csv_source.seek(0)
-            headers = csv_source.readline().strip()
-            csv_source.seek(0)
-
-            cur.copy_expert(
-                f"""
-                COPY {tmp_table_name} ({headers}) FROM STDIN WITH CSV HEADER;
-                """,
-                csv_source,
+        with measure('copy', table_name) as copy_metrics:
+            _copy_into(
+                cur = cur,
+                into_table_name = tmp_table_name,
+                table_name = table_name,
+                csv_source = csv_source,
+                columns = columns,
+                has_generated_primary = has_generated_primary,
+                metrics = copy_metrics,
             )
 
-            cur.execute(
-                f"""
-                INSERT INTO {table_name}
-                OVERRIDING SYSTEM VALUE
-                SELECT * FROM {tmp_table_name}
-                ON CONFLICT DO NOTHING;
-                """
-            )
-        else:
-            cur.copy_expert(
-                f"""
-                COPY {tmp_table_name} FROM STDIN WITH CSV HEADER;
-                """,
-                csv_source,
-            )
+        with measure('merge', table_name) as merge_metrics:
+            merge_metrics.rows_in = copy_metrics.rows_out
+
+            if has_row_hash and _MERGE_MODE == 'hash':
+                _hash_merge(
+                    cur = cur,
+                    table_name = table_name,
+                    tmp_table_name = tmp_table_name,
+                    columns = columns,
+                    metrics = merge_metrics,
+                )
+                return copy_metrics.rows_out
+
+            # Leave the identity to the target table, the staging identity restarts at 1 on every run
+            insert_columns = _read_csv_headers(csv_source) if has_generated_primary else columns
+            targets = ', '.join(insert_columns)
+            values = ', '.join(insert_columns)
+
+            if has_row_hash:
+                targets += f', {_ROW_HASH_COLUMN}'
+                values += f', {_row_hash(alias = tmp_table_name, columns = insert_columns)}'
 
             cur.execute(
                 f"""
-                INSERT INTO {table_name}
-                SELECT * FROM {tmp_table_name}
-                ON CONFLICT DO NOTHING;
+                INSERT INTO {table_name} AS {_MERGE_ALIAS} ({targets})
+                SELECT {values} FROM {tmp_table_name}
+                {conflict_clause};
                 """
             )
+
+            merge_metrics.rows_out = cur.rowcount
+            merge_metrics.rows_dropped = merge_metrics.rows_in - merge_metrics.rows_out
+
+        return copy_metrics.rows_out
@@ -16,24 +16,44 @@
 #  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
 #  to permit persons to whom the Software is furnished to do so.
 #
+import functools
+import hashlib
 import os
+import re
 import psycopg2
 import time
 import pathlib
 from urllib.parse import urlparse
-from psycopg2 import OperationalError
+from psycopg2 import OperationalError, errors
+from psycopg2.pool import ThreadedConnectionPool
 from logger import debug, info, warning, error, critical
+from scheduler import Task, run_task_graph
+from metrics import measure
+
+# Constants
+
+_POOL_SIZE = int(os.getenv('INGEST_POOL_SIZE', 4))
+
+_INDEX_MAINTENANCE_WORK_MEM = os.getenv('INDEX_MAINTENANCE_WORK_MEM', '256MB')
+
+_SQL_COMMENT_REGEX = re.compile(r'/\*.*?\*/|--[^\n]*', re.DOTALL)
+_CONSTRAINT_REGEX = re.compile(r'ALTER\s+TABLE\s+(\w+)\s+ADD\s+CONSTRAINT\s+(\w+)', re.IGNORECASE)
+_REFERENCES_REGEX = re.compile(r'REFERENCES\s+(\w+)', re.IGNORECASE)
+_INDEX_REGEX = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(\w+)',
+    re.IGNORECASE,
+)
 
 
 # Functions
 
-def _parse_database_url():
+def _parse_database_url(schema = None):
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("Missing DATABASE_URL env var")
 
     parsed = urlparse(url)
-    return {
+    config = {
         'host'    : parsed.hostname,
         'port'    : parsed.port,
         'dbname'  : parsed.path.lstrip("/"),
@@ -41,21 +61,39 @@ def _parse_database_url():
         'password': parsed.password,
     }
 
+    # Set at connect time so it survives rollbacks, unlike a SET issued inside a transaction
+    if schema is not None:
+        config['options'] = f'-c search_path={schema}'
+
+    return config
+
 
 def _get_sql_src_dir():
     return pathlib.Path('./src/main/sql')
 
 
 def _execute_sql_file(conn, rel_path):
+    if not _read_sql_statements(rel_path):
+        debug(f'Nothing to execute in {rel_path}')
+        return True
+
     info(f'Executing {rel_path}...')
     try:
         with conn.cursor() as cur:
+            # Keep a failing file (e.g. types that already exist on a re-run) from aborting the files after it
+            cur.execute('SAVEPOINT sql_file;')
             with (_get_sql_src_dir() / rel_path).open('r', encoding = 'utf-8') as f:
                 cur.execute(f.read())
+            cur.execute('RELEASE SAVEPOINT sql_file;')
     except Exception as e:
         error(f'Failed to execute {rel_path}: {e}')
+        with conn.cursor() as cur:
+            cur.execute('ROLLBACK TO SAVEPOINT sql_file;')
+        return False
     info(f'Done executing {rel_path}')
 
+    return True
+
 
 def _execute_sql_dir(conn, rel_path):
     sql_src_dir = _get_sql_src_dir()
@@ -63,8 +101,93 @@ def _execute_sql_dir(conn, rel_path):
         _execute_sql_file(conn = conn, rel_path = file.relative_to(sql_src_dir))
 
 
-def connect_db(retries = 10, delay = 2):
-    config = _parse_database_url()
+def _read_sql_statements(rel_path):
+    sql = (_get_sql_src_dir() / rel_path).read_text(encoding = 'utf-8')
+    statements = _SQL_COMMENT_REGEX.sub('', sql).split(';')
+
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def _describe_statement(statement):
+    constraint = _CONSTRAINT_REGEX.search(statement)
+    if constraint:
+        table_name, name = constraint.groups()
+        return name, { table_name, *_REFERENCES_REGEX.findall(statement) }
+
+    index = _INDEX_REGEX.search(statement)
+    if index:
+        name, table_name = index.groups()
+        return name, { table_name }
+
+    return None, set()
+
+
+def _load_table_sizes(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT relname, pg_total_relation_size(oid)
+            FROM pg_class
+            WHERE relkind = 'r' AND relnamespace = current_schema()::regnamespace;
+            """
+        )
+
+        return dict(cur.fetchall())
+
+
+def _post_ingest_files():
+    sql_src_dir = _get_sql_src_dir()
+
+    return [
+        *(file.relative_to(sql_src_dir) for file in sorted((sql_src_dir / '03_constraint').glob('*.sql'))),
+        pathlib.Path('04_index.sql'),
+    ]
+
+
+def _build_schema_object(conn, name, statement):
+    with measure('index_build', name) as metrics:
+        with conn.cursor() as cur:
+            cur.execute('SELECT set_config(%s, %s, true);', ('maintenance_work_mem', _INDEX_MAINTENANCE_WORK_MEM))
+            try:
+                cur.execute(statement)
+            except (errors.DuplicateObject, errors.DuplicateTable):
+                # Left behind by an earlier run that stopped before its checkpoint
+                conn.rollback()
+                info(f'{name} already exists')
+                return
+
+    info(f'Built {name} in {metrics.duration:.2f}s')
+
+
+def _build_schema_objects(conn, pool, rel_paths):
+    statements = [statement for rel_path in rel_paths for statement in _read_sql_statements(rel_path)]
+    table_sizes = _load_table_sizes(conn)
+
+    tasks = []
+    for position, statement in enumerate(statements):
+        name, tables = _describe_statement(statement)
+
+        if name is None:
+            warning(f'Could not determine what statement {position} builds, running it on its own')
+            name = f'statement_{position}'
+            tables = { '*' }
+
+        tasks.append(
+            Task(
+                name = name,
+                block = functools.partial(_build_schema_object, name = name, statement = statement),
+                locks = tables,
+            ),
+        )
+
+    # Start on the biggest tables first so they don't end up as the tail of the run
+    tasks.sort(key = lambda task: max(table_sizes.get(table, 0) for table in task.locks), reverse = True)
+
+    return run_task_graph(pool = pool, tasks = tasks, commit_each = True)
+
+
+def connect_db(retries = 10, delay = 2, schema = None):
+    config = _parse_database_url(schema = schema)
 
     for attempt in range(retries):
         info(f'Attempting to connect to database, attempt {attempt + 1}/{retries}')
@@ -79,6 +202,15 @@ def connect_db(retries = 10, delay = 2):
     raise RuntimeError('Could not connect to DB after several attempts.')
 
 
+def connect_pool(size = _POOL_SIZE, schema = None):
+    config = _parse_database_url(schema = schema)
+
+    pool = ThreadedConnectionPool(minconn = 1, maxconn = size, **config)
+    info(f'Opened connection pool with up to {size} connections')
+
+    return pool
+
+
 def setup_db(conn):
     info('Setting up database...')
 
@@ -98,28 +230,41 @@ def setup_db(conn):
     info('Done setting up database')
 
 
-def setup_post_ingest_db(conn):
-    info('Setting up database post ingest...')
+def post_ingest_inputs():
+    sql_src_dir = _get_sql_src_dir()
+
+    for rel_path in [*_post_ingest_files(), '05_view.sql', '06_trigger.sql', '07_dev_fixture.sql']:
+        yield str(rel_path), hashlib.sha256((sql_src_dir / rel_path).read_bytes()).hexdigest()
 
-    info('Creating constraints...')
-    _execute_sql_dir(conn = conn, rel_path = '03_constraint')
-    info('Done creating constraints')
 
-    info('Creating indexes...')
-    _execute_sql_file(conn = conn, rel_path = '04_index.sql')
-    info('Done creating indexes')
+def post_ingest_objects():
+    for rel_path in _post_ingest_files():
+        for statement in _read_sql_statements(rel_path):
+            name, _ = _describe_statement(statement)
+            if name is not None:
+                yield name
+
+
+def setup_post_ingest_db(conn, pool):
+    info('Setting up database post ingest...')
+
+    info('Creating constraints and indexes...')
+    failed = _build_schema_objects(conn = conn, pool = pool, rel_paths = _post_ingest_files())
+    info('Done creating constraints and indexes')
 
     info('Creating views...')
-    _execute_sql_file(conn = conn, rel_path = '05_view.sql')
+    views_created = _execute_sql_file(conn = conn, rel_path = '05_view.sql')
     info('Done creating views')
 
     info('Creating triggers...')
-    _execute_sql_file(conn = conn, rel_path = '06_trigger.sql')
+    triggers_created = _execute_sql_file(conn = conn, rel_path = '06_trigger.sql')
     info('Done creating triggers')
 
     info('Creating dev fixtures...')
-    _execute_sql_file(conn = conn, rel_path = '07_dev_fixture.sql')
+    fixtures_created = _execute_sql_file(conn = conn, rel_path = '07_dev_fixture.sql')
     info('Done creating dev fixtures')
 
     conn.commit()
     info('Done setting up database post ingest')
+
+    return not failed and views_created and triggers_created and fixtures_created
@@ -0,0 +1,67 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import pandas as pd
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+_NULL_VALUES = ['', '\\N']
+
+
+# Functions
+
+def read_csv_frame(path, text_columns = (), chunksize = None):
+    # Let the C parser type the numeric columns, blanks come back as NaN the same as the row path's None
+    return pd.read_csv(
+        path,
+        dtype = { column: str for column in text_columns },
+        keep_default_na = False,
+        na_values = _NULL_VALUES,
+        encoding = 'utf-8',
+        chunksize = chunksize,
+    )
+
+
+def int_column(column):
+    return column.astype('int64')
+
+
+def optional_int_column(column):
+    return column.astype('Int64')
+
+
+def bool_column(column):
+    return column == 1
+
+
+def enum_column(column, enum_map, optional = False):
+    mapped = column.map({ int(key): value for key, value in enum_map.items() })
+    unknown = mapped.isna()
+
+    if optional:
+        unknown &= column.notna()
+
+    if unknown.any():
+        raise KeyError(f'Unknown ids in {column.name}: {sorted(set(column[unknown]))[:10]}')
+
+    return mapped
+
+
+def columns_to_csv_text(headers, columns, header = True):
+    return pd.DataFrame(dict(zip(headers, columns))).to_csv(index = False, header = header, lineterminator = '\n')
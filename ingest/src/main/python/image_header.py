@@ -0,0 +1,144 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import re
+import struct
+
+# Constants
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_CHUNK_HEADER = struct.Struct('>I4s')
+_PNG_SIZE = struct.Struct('>II')
+_PNG_FRAME_COUNT = struct.Struct('>I')
+
+_GIF_SIGNATURES = (b'GIF87a', b'GIF89a')
+_GIF_SIZE = struct.Struct('<HH')
+_GIF_IMAGE_DESCRIPTOR = 0x2C
+_GIF_EXTENSION = 0x21
+_GIF_TRAILER = 0x3B
+
+_SVG_TAG_REGEX = re.compile(rb'<svg\b[^>]*>', re.IGNORECASE)
+_SVG_ATTRIBUTE_REGEX = re.compile(rb'\s(width|height|viewBox)\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+_SVG_LENGTH_REGEX = re.compile(rb'^\s*([0-9]*\.?[0-9]+)\s*(?:px)?\s*$')
+
+
+# Utilities
+
+def _png_dimensions(data):
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        return None
+
+    width, height = _PNG_SIZE.unpack_from(data, 16)
+
+    # Only the chunk headers are walked, an animated PNG announces its frames in acTL before the first IDAT
+    frame_count = 1
+    offset = len(_PNG_SIGNATURE)
+    while offset + _PNG_CHUNK_HEADER.size <= len(data):
+        length, kind = _PNG_CHUNK_HEADER.unpack_from(data, offset)
+
+        if kind == b'acTL' and offset + 12 <= len(data):
+            frame_count = _PNG_FRAME_COUNT.unpack_from(data, offset + 8)[0]
+            break
+        if kind in (b'IDAT', b'IEND'):
+            break
+
+        offset += _PNG_CHUNK_HEADER.size + length + 4
+
+    return width, height, frame_count
+
+
+def _skip_gif_sub_blocks(data, offset):
+    while offset < len(data):
+        size = data[offset]
+        offset += 1 + size
+
+        if size == 0:
+            break
+
+    return offset
+
+
+def _gif_dimensions(data):
+    if len(data) < 13:
+        return None
+
+    width, height = _GIF_SIZE.unpack_from(data, 6)
+
+    # Skip the global color table, then hop over every block by its length without touching the LZW data
+    packed = data[10]
+    offset = 13 + (3 << ((packed & 0x07) + 1) if packed & 0x80 else 0)
+
+    frame_count = 0
+    while offset < len(data):
+        introducer = data[offset]
+
+        if introducer == _GIF_IMAGE_DESCRIPTOR:
+            if offset + 10 > len(data):
+                break
+
+            frame_count += 1
+            packed = data[offset + 9]
+            offset += 10 + (3 << ((packed & 0x07) + 1) if packed & 0x80 else 0)
+
+            # LZW minimum code size, followed by the image data sub-blocks
+            offset = _skip_gif_sub_blocks(data, offset + 1)
+        elif introducer == _GIF_EXTENSION:
+            offset = _skip_gif_sub_blocks(data, offset + 2)
+        else:
+            break
+
+    return width, height, frame_count
+
+
+def _svg_length(value):
+    match = _SVG_LENGTH_REGEX.match(value)
+    return round(float(match.group(1))) if match else None
+
+
+def _svg_dimensions(data):
+    tag = _SVG_TAG_REGEX.search(data)
+    if tag is None:
+        return None
+
+    attributes = { name.lower(): value for name, value in _SVG_ATTRIBUTE_REGEX.findall(tag.group(0)) }
+
+    width = _svg_length(attributes.get(b'width', b''))
+    height = _svg_length(attributes.get(b'height', b''))
+
+    # Relative or missing sizes fall back to the viewBox, which is what the sprite is drawn in
+    view_box = attributes.get(b'viewbox', b'').replace(b',', b' ').split()
+    if len(view_box) == 4:
+        try:
+            width = width if width is not None else round(float(view_box[2]))
+            height = height if height is not None else round(float(view_box[3]))
+        except ValueError:
+            pass
+
+    return width, height, 1
+
+
+# Functions
+
+def read_dimensions(data):
+    if data[:len(_PNG_SIGNATURE)] == _PNG_SIGNATURE:
+        return _png_dimensions(data)
+
+    if data[:6] in _GIF_SIGNATURES:
+        return _gif_dimensions(data)
+
+    return _svg_dimensions(data)
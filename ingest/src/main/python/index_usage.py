@@ -0,0 +1,131 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import datetime
+import os
+from logger import debug, info, warning, error, critical
+from metrics import write_json_report
+
+# Constants
+
+INDEX_REPORT = os.getenv('INGEST_INDEX_REPORT', 'true').lower() == 'true'
+
+_REPORT_FILE_NAME = 'index-usage.json'
+
+
+# Utilities
+
+def _load_index_stats(cur):
+    # Unique and primary key indexes enforce constraints, so a lack of scans says nothing about them
+    cur.execute(
+        """
+        SELECT s.relname,
+               s.indexrelname,
+               s.idx_scan,
+               s.idx_tup_read,
+               s.idx_tup_fetch,
+               pg_relation_size(s.indexrelid),
+               (i.indkey::INT2[])[0:i.indnkeyatts - 1],
+               i.indpred IS NOT NULL,
+               i.indisunique
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.schemaname = current_schema()
+        ORDER BY s.relname, s.indexrelname;
+        """
+    )
+
+    return cur.fetchall()
+
+
+def _load_stats_reset(cur):
+    cur.execute('SELECT stats_reset FROM pg_stat_database WHERE datname = current_database();')
+    row = cur.fetchone()
+
+    return row[0] if row else None
+
+
+def _find_redundant(indexes):
+    # A plain index whose keys lead another index on the same table is served by that index as well
+    redundant = { }
+    for index in indexes:
+        if index['unique'] or index['partial'] or 0 in index['keys']:
+            continue
+
+        for other in indexes:
+            if other is index or other['table'] != index['table'] or other['partial']:
+                continue
+            if len(other['keys']) > len(index['keys']) and other['keys'][:len(index['keys'])] == index['keys']:
+                redundant[index['name']] = other['name']
+                break
+
+    return redundant
+
+
+# Functions
+
+def report_index_usage(conn):
+    try:
+        with conn.cursor() as cur:
+            rows = _load_index_stats(cur)
+            stats_reset = _load_stats_reset(cur)
+        conn.rollback()
+    except Exception as e:
+        error(f'Could not load index usage: {e}')
+        conn.rollback()
+        return
+
+    if not rows:
+        info('No indexes to report usage for yet')
+        return
+
+    indexes = [
+        {
+            'table'    : table_name,
+            'name'     : index_name,
+            'scans'    : scans,
+            'tup_read' : tup_read,
+            'tup_fetch': tup_fetch,
+            'bytes'    : size,
+            'keys'     : list(keys or []),
+            'partial'  : partial,
+            'unique'   : unique,
+        }
+        for table_name, index_name, scans, tup_read, tup_fetch, size, keys, partial, unique in rows
+    ]
+    redundant = _find_redundant(indexes)
+
+    for index in indexes:
+        index['unused'] = index['scans'] == 0 and not index['unique']
+        index['redundant_with'] = redundant.get(index['name'])
+
+        if index['unused']:
+            warning(f'Index {index["name"]} on {index["table"]} has never been scanned ({index["bytes"]} bytes)')
+        if index['redundant_with']:
+            warning(f'Index {index["name"]} on {index["table"]} is covered by {index["redundant_with"]}')
+
+    write_json_report(
+        _REPORT_FILE_NAME,
+        {
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'stats_since' : stats_reset,
+            'unused'      : [index['name'] for index in indexes if index['unused']],
+            'redundant'   : redundant,
+            'indexes'     : indexes,
+        },
+    )
@@ -16,11 +16,22 @@
 #  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
 #  to permit persons to whom the Software is furnished to do so.
 #
+import functools
 import sys
-from csv_ingester import ingest_csv_files
-from sprite_ingester import ingest_sprites
+from csv_ingester import ingest_csv_files, csv_inputs
+from sprite_ingester import ingest_sprites, sprite_inputs
 from logger import debug, info, warning, error, critical
-from database_handler import connect_db, setup_db, setup_post_ingest_db
+from database_handler import (
+    connect_db, connect_pool, setup_db, setup_post_ingest_db, post_ingest_inputs, post_ingest_objects,
+)
+from checkpoint import Stage, run_stages
+from ingest_bundle import BUNDLE_MODE, build_bundle, load_bundle, bundle_inputs
+from sqlite_export import SQLITE_EXPORT, export_sqlite, sqlite_export_inputs, sqlite_export_outputs
+from metrics import write_reports
+from index_usage import INDEX_REPORT, report_index_usage
+from shadow_schema import (
+    SHADOW_LOAD, ROLLBACK, prepare_shadow_schema, validate_shadow_schema, swap_shadow_schema, rollback_schema,
+)
 
 
 # Script
@@ -28,26 +39,109 @@ from database_handler import connect_db, setup_db, setup_post_ingest_db
 def main():
     sys.stdout.reconfigure(line_buffering = True)
 
-    with connect_db() as conn:
+    # Transforms every table once into a bundle other environments load, no database involved
+    if BUNDLE_MODE == 'build':
+        try:
+            build_bundle()
+        finally:
+            write_reports()
+        return
+
+    if ROLLBACK:
+        with connect_db() as conn:
+            rollback_schema(conn)
+        return
+
+    # Taken before this run rebuilds or swaps anything, so it covers the usage since the last build
+    if INDEX_REPORT:
+        with connect_db() as conn:
+            report_index_usage(conn)
+
+    # Readers keep the live schema until the fully built shadow is swapped in
+    schema = None
+    if SHADOW_LOAD:
+        with connect_db() as conn:
+            schema = prepare_shadow_schema(conn)
+
+    with connect_db(schema = schema) as conn:
         # Setup database
         setup_db(conn)
 
-        # Ingest CSV Files
+        pool = connect_pool(schema = schema)
         try:
-            info("Ingesting CSV files...")
-            ingest_csv_files(conn)
-        except Exception as e:
-            error(f"Could not ingest CSV files: {e}")
+            # A prebuilt bundle replaces the CSV and sprite stages
+            if BUNDLE_MODE == 'load':
+                load_stages = [
+                    Stage(
+                        name = 'bundle',
+                        inputs = bundle_inputs,
+                        block = functools.partial(load_bundle, pool),
+                    ),
+                ]
+            else:
+                load_stages = [
+                    Stage(
+                        name = 'csv',
+                        inputs = csv_inputs,
+                        block = functools.partial(ingest_csv_files, pool),
+                    ),
+                    Stage(
+                        name = 'sprites',
+                        inputs = sprite_inputs,
+                        block = functools.partial(ingest_sprites, conn),
+                    ),
+                ]
 
-        # Ingest Sprites
-        try:
-            info("Ingesting sprites...")
-            ingest_sprites(conn)
-        except Exception as e:
-            error(f"Failed to ingest sprites: {e}")
+            # Edge nodes only get data readers can see, a shadow is exported once it has been swapped in
+            export_stages = []
+            if SQLITE_EXPORT and schema is None:
+                export_stages = [
+                    Stage(
+                        name = 'sqlite_export',
+                        inputs = functools.partial(
+                            sqlite_export_inputs,
+                            conn,
+                            upstream_stages = [*(stage.name for stage in load_stages), 'post_ingest'],
+                        ),
+                        block = functools.partial(export_sqlite, conn),
+                        outputs = sqlite_export_outputs,
+                    ),
+                ]
+
+            # Ingest, then set up the database post ingest, resuming after the stages an earlier run completed
+            # A shadow is always built from scratch, its checkpoints only go live with it on the swap
+            completed = run_stages(
+                conn = conn,
+                resume = schema is None,
+                stages = [
+                    *load_stages,
+                    Stage(
+                        name = 'post_ingest',
+                        inputs = post_ingest_inputs,
+                        block = functools.partial(setup_post_ingest_db, conn, pool),
+                    ),
+                    *export_stages,
+                ],
+            )
+
+            # Swap the shadow schema in, only once every stage finished against it
+            if schema is not None:
+                if not completed:
+                    critical(f'Keeping the live schema, not every stage completed against {schema}')
+                elif validate_shadow_schema(conn = conn, expected_objects = post_ingest_objects()):
+                    swap_shadow_schema(conn)
 
-        # Setup database post ingest
-        setup_post_ingest_db(conn)
+                    if SQLITE_EXPORT:
+                        try:
+                            with connect_db() as live_conn:
+                                export_sqlite(live_conn)
+                        except Exception as e:
+                            error(f'Failed to export SQLite snapshot: {e}')
+                else:
+                    critical(f'Keeping the live schema, {schema} is left in place for inspection')
+        finally:
+            pool.closeall()
+            write_reports()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,222 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import csv
+import datetime
+import functools
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+from logger import debug, info, warning, error, critical
+from csv_utils import ingest_csv, finish_hash_merges
+from csv_ingester import iter_csv_payloads
+from sprite_ingester import iter_sprite_payloads
+from metrics import measure
+from nginx_config import write_nginx_config
+from scheduler import Task, run_task_graph, dependency_order
+
+# Constants
+
+# 'build' writes the COPY payloads of every table into INGEST_BUNDLE_DIR without a database, 'load' streams them in
+BUNDLE_MODE = os.getenv('INGEST_BUNDLE', '').lower()
+
+_BUNDLE_DIR = pathlib.Path(os.getenv('INGEST_BUNDLE_DIR', 'bundle'))
+_COMPRESS_LEVEL = int(os.getenv('INGEST_BUNDLE_COMPRESS_LEVEL', 6))
+
+_MANIFEST_FILE_NAME = 'manifest.json'
+_PAYLOAD_SUFFIX = '.csv.gz'
+
+# Bump whenever the layout of a bundle changes, a loader refuses bundles it does not know
+_FORMAT_VERSION = 1
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+# Utilities
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _count_rows(path):
+    with gzip.open(path, 'rt', encoding = 'utf-8', newline = '') as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+def _write_payload(table_name, source, has_generated_primary = False, upsert = None, depends_on = ()):
+    path = _BUNDLE_DIR / f'{table_name}{_PAYLOAD_SUFFIX}'
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+
+    # A zero mtime keeps the gzip header free of the build time, the same data always gets the same checksum
+    with measure('bundle_write', table_name) as metrics:
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(mode = 'wb', fileobj = raw, mtime = 0, compresslevel = _COMPRESS_LEVEL) as compressed:
+                for chunk in iter(lambda: source.read(_COPY_CHUNK_SIZE), ''):
+                    data = chunk.encode('utf-8')
+                    compressed.write(data)
+                    metrics.bytes += len(data)
+
+        os.replace(tmp_path, path)
+        metrics.rows_out = _count_rows(path)
+
+    conflict_columns, update_columns = upsert or (None, None)
+
+    # Carries everything ingest_csv needs, loading a bundle never imports the mappers' table knowledge
+    return {
+        'table'                : table_name,
+        'file'                 : path.name,
+        'sha256'               : _hash_file(path),
+        'bytes'                : path.stat().st_size,
+        'rows'                 : metrics.rows_out,
+        'has_generated_primary': has_generated_primary,
+        'conflict_columns'     : conflict_columns,
+        'update_columns'       : update_columns,
+        'depends_on'           : list(depends_on),
+    }
+
+
+def _write_manifest(tables):
+    manifest = {
+        'format'    : _FORMAT_VERSION,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'tables'    : tables,
+    }
+
+    path = _BUNDLE_DIR / _MANIFEST_FILE_NAME
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent = 2), encoding = 'utf-8')
+    os.replace(tmp_path, path)
+
+
+def _remove_stale_payloads(tables):
+    current = { entry['file'] for entry in tables }
+
+    for path in _BUNDLE_DIR.glob(f'*{_PAYLOAD_SUFFIX}'):
+        if path.name not in current:
+            debug(f'Removing stale payload {path.name}')
+            path.unlink()
+
+
+def _load_manifest():
+    manifest = json.loads((_BUNDLE_DIR / _MANIFEST_FILE_NAME).read_text(encoding = 'utf-8'))
+
+    if manifest.get('format') != _FORMAT_VERSION:
+        raise ValueError(f'Unsupported bundle format {manifest.get("format")}, expected {_FORMAT_VERSION}')
+
+    return manifest
+
+
+def _load_payload(conn, entry):
+    table_name = entry['table']
+    path = _BUNDLE_DIR / entry['file']
+
+    with measure('bundle_verify', table_name) as metrics:
+        metrics.bytes = path.stat().st_size
+        if _hash_file(path) != entry['sha256']:
+            raise ValueError(f'Checksum mismatch for {path.name}, the bundle is corrupt or incomplete')
+
+    with gzip.open(path, 'rt', encoding = 'utf-8', newline = '') as source:
+        rows = ingest_csv(
+            conn = conn,
+            csv_source = source,
+            table_name = table_name,
+            has_generated_primary = entry['has_generated_primary'],
+            conflict_columns = entry['conflict_columns'],
+            update_columns = entry['update_columns'],
+        )
+
+    # Raising rolls the table back, a short payload never ends up committed
+    if rows != entry['rows']:
+        raise ValueError(f'Loaded {rows} rows into {table_name}, the bundle manifest lists {entry["rows"]}')
+
+    info(f'Loaded {rows} rows into {table_name} from {path.name}')
+
+
+# Functions
+
+def build_bundle():
+    info(f'Building ingest bundle in {_BUNDLE_DIR}...')
+    _BUNDLE_DIR.mkdir(parents = True, exist_ok = True)
+
+    tables = []
+
+    for table_name, open_payload, depends_on in iter_csv_payloads():
+        with open_payload() as source:
+            tables.append(_write_payload(table_name = table_name, source = source, depends_on = depends_on))
+        info(f'Bundled {tables[-1]["rows"]} rows of {table_name}')
+
+    for table_name, source, has_generated_primary, upsert, depends_on in iter_sprite_payloads():
+        tables.append(
+            _write_payload(
+                table_name = table_name,
+                source = source,
+                has_generated_primary = has_generated_primary,
+                upsert = upsert,
+                depends_on = depends_on,
+            ),
+        )
+        info(f'Bundled {tables[-1]["rows"]} rows of {table_name}')
+
+    # Written last, a bundle without its manifest is never picked up half built
+    _write_manifest(tables)
+    _remove_stale_payloads(tables)
+
+    info(f'Done building ingest bundle with {len(tables)} tables')
+
+
+def bundle_inputs():
+    yield _MANIFEST_FILE_NAME, _hash_file(_BUNDLE_DIR / _MANIFEST_FILE_NAME)
+
+
+def load_bundle(pool):
+    manifest = _load_manifest()
+    info(f'Loading ingest bundle from {manifest["created_at"]} with {len(manifest["tables"])} tables')
+
+    tasks = [
+        Task(
+            name = entry['table'],
+            block = functools.partial(_load_payload, entry = entry),
+            depends_on = entry['depends_on'],
+        )
+        for entry in manifest['tables']
+    ]
+
+    failed = run_task_graph(pool = pool, tasks = tasks, commit_each = True)
+
+    conn = pool.getconn()
+    try:
+        finish_hash_merges(conn = conn, table_names = dependency_order(tasks), delete_missing = not failed)
+    finally:
+        pool.putconn(conn)
+
+    # The sprite stage this replaces is what normally writes the sprite server config
+    try:
+        sprite_count = sum(entry['rows'] for entry in manifest['tables'] if entry['table'] == 'pokemon_sprite')
+        write_nginx_config(file_count = sprite_count)
+    except Exception as e:
+        error(f'Failed to write nginx config: {e}')
+
+    return not failed
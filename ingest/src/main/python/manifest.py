@@ -0,0 +1,108 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import hashlib
+import os
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+FORCE_RELOAD = os.getenv('INGEST_FORCE_RELOAD', 'false').lower() == 'true'
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Utilities
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _load_entries(conn, table_name):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT file_name, size_bytes, mtime, content_hash, mapper_version
+            FROM ingest_manifest
+            WHERE table_name = %s;
+            """,
+            (table_name,),
+        )
+
+        return { row[0]: row[1:] for row in cur.fetchall() }
+
+
+def _fingerprint(path, stored):
+    stat = os.stat(path)
+
+    # Size and mtime unchanged means the stored hash is still valid, only re-hash when either moved
+    if stored is not None and stored[0] == stat.st_size and stored[1] == stat.st_mtime:
+        return stat.st_size, stat.st_mtime, stored[2]
+
+    return stat.st_size, stat.st_mtime, _hash_file(path)
+
+
+# Functions
+
+def check_manifest(conn, table_name, paths, mapper_version):
+    stored = _load_entries(conn = conn, table_name = table_name)
+
+    fingerprints = {
+        path.name: _fingerprint(path = path, stored = stored.get(path.name))
+        for path in paths
+    }
+
+    unchanged = (
+        not FORCE_RELOAD
+        and stored.keys() == fingerprints.keys()
+        and all(
+            stored[name][2] == fingerprint[2] and stored[name][3] == mapper_version
+            for name, fingerprint in fingerprints.items()
+        )
+    )
+
+    debug(f'Manifest for {table_name}: {"unchanged" if unchanged else "changed"}')
+
+    return unchanged, fingerprints
+
+
+def record_manifest(conn, table_name, fingerprints, mapper_version):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM ingest_manifest WHERE table_name = %s;
+            """,
+            (table_name,),
+        )
+
+        cur.executemany(
+            """
+            INSERT INTO ingest_manifest (table_name, file_name, size_bytes, mtime, content_hash, mapper_version)
+            VALUES (%s, %s, %s, %s, %s, %s);
+            """,
+            [
+                (table_name, name, size, mtime, content_hash, mapper_version)
+                for name, (size, mtime, content_hash) in fingerprints.items()
+            ],
+        )
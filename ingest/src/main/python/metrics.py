@@ -0,0 +1,239 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import threading
+import time
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+_METRICS_DIR = pathlib.Path(os.getenv('INGEST_METRICS_DIR', 'metrics'))
+
+_REPORT_FILE_NAME = 'ingest-report.json'
+_PROMETHEUS_FILE_NAME = 'ingest.prom'
+
+_PROMETHEUS_PREFIX = 'pokebe_ingest'
+
+# (metric, attribute, help)
+_PROMETHEUS_STAGE_METRICS = [
+    ('stage_duration_seconds', 'duration', 'Time spent in an ingest stage'),
+    ('stage_rows_in', 'rows_in', 'Rows handed to an ingest stage'),
+    ('stage_rows_out', 'rows_out', 'Rows produced by an ingest stage'),
+    ('stage_bytes', 'bytes', 'Bytes read or streamed by an ingest stage'),
+    ('stage_rows_dropped', 'rows_dropped', 'Rows dropped by ON CONFLICT DO NOTHING during a merge'),
+    ('stage_rows_inserted', 'rows_inserted', 'Rows a hash merge inserted'),
+    ('stage_rows_updated', 'rows_updated', 'Rows a hash merge rewrote because their content changed'),
+    ('stage_rows_deleted', 'rows_deleted', 'Rows a hash merge deleted because the source no longer has them'),
+    ('stage_rows_unchanged', 'rows_unchanged', 'Rows a hash merge left untouched'),
+    ('stage_failed', 'failed', 'Whether an ingest stage failed'),
+]
+
+
+# Classes
+
+class StageMetrics:
+    def __init__(self, stage, table_name):
+        self.stage = stage
+        self.table_name = table_name
+        self.duration = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes = 0
+        self.rows_dropped = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_deleted = 0
+        self.rows_unchanged = 0
+        self.failed = False
+
+    def to_dict(self):
+        return {
+            'stage'           : self.stage,
+            'table'           : self.table_name,
+            'duration_seconds': self.duration,
+            'rows_in'         : self.rows_in,
+            'rows_out'        : self.rows_out,
+            'bytes'           : self.bytes,
+            'rows_dropped'    : self.rows_dropped,
+            'rows_inserted'   : self.rows_inserted,
+            'rows_updated'    : self.rows_updated,
+            'rows_deleted'    : self.rows_deleted,
+            'rows_unchanged'  : self.rows_unchanged,
+            'failed'          : self.failed,
+        }
+
+
+class CountingReader:
+    def __init__(self, source):
+        self._source = source
+        self.bytes = 0
+
+    def read(self, size = -1):
+        data = self._source.read(size)
+        self.bytes += len(data)
+        return data
+
+    def readline(self, size = -1):
+        data = self._source.readline(size)
+        self.bytes += len(data)
+        return data
+
+
+# Variables
+
+_lock = threading.Lock()
+_stages = []
+_started_at = time.time()
+
+
+# Utilities
+
+def _write_atomically(path, content):
+    # Scrapers and collectors must never see a half written file
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.write_text(content, encoding = 'utf-8')
+    os.replace(tmp_path, path)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _render_prometheus(stages, finished_at):
+    lines = []
+
+    for metric, attribute, help_text in _PROMETHEUS_STAGE_METRICS:
+        name = f'{_PROMETHEUS_PREFIX}_{metric}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+
+        for stage in stages:
+            labels = f'stage="{_escape_label(stage.stage)}",table="{_escape_label(stage.table_name)}"'
+            lines.append(f'{name}{{{labels}}} {float(getattr(stage, attribute))}')
+
+    lines.append(f'# HELP {_PROMETHEUS_PREFIX}_run_duration_seconds Wall time of the last ingest run')
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_run_duration_seconds gauge')
+    lines.append(f'{_PROMETHEUS_PREFIX}_run_duration_seconds {finished_at - _started_at}')
+
+    lines.append(f'# HELP {_PROMETHEUS_PREFIX}_last_run_timestamp_seconds Unix time the last ingest run finished')
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge')
+    lines.append(f'{_PROMETHEUS_PREFIX}_last_run_timestamp_seconds {finished_at}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _render_report(stages, finished_at):
+    totals = { }
+    for stage in stages:
+        total = totals.setdefault(
+            stage.stage,
+            {
+                'duration_seconds': 0.0,
+                'rows_in'         : 0,
+                'rows_out'        : 0,
+                'bytes'           : 0,
+                'rows_dropped'    : 0,
+                'rows_inserted'   : 0,
+                'rows_updated'    : 0,
+                'rows_deleted'    : 0,
+                'rows_unchanged'  : 0,
+                'failed'          : 0,
+            },
+        )
+        total['duration_seconds'] += stage.duration
+        total['rows_in'] += stage.rows_in
+        total['rows_out'] += stage.rows_out
+        total['bytes'] += stage.bytes
+        total['rows_dropped'] += stage.rows_dropped
+        total['rows_inserted'] += stage.rows_inserted
+        total['rows_updated'] += stage.rows_updated
+        total['rows_deleted'] += stage.rows_deleted
+        total['rows_unchanged'] += stage.rows_unchanged
+        total['failed'] += int(stage.failed)
+
+    return json.dumps(
+        {
+            'started_at'      : datetime.datetime.fromtimestamp(_started_at, datetime.timezone.utc).isoformat(),
+            'finished_at'     : datetime.datetime.fromtimestamp(finished_at, datetime.timezone.utc).isoformat(),
+            'duration_seconds': finished_at - _started_at,
+            'totals'          : totals,
+            'stages'          : [stage.to_dict() for stage in stages],
+        },
+        indent = 2,
+    )
+
+
+# Functions
+
+def record(stage, table_name):
+    metrics = StageMetrics(stage = stage, table_name = table_name)
+
+    with _lock:
+        _stages.append(metrics)
+
+    return metrics
+
+
+@contextlib.contextmanager
+def measure(stage, table_name):
+    metrics = record(stage = stage, table_name = table_name)
+    start = time.perf_counter()
+
+    try:
+        yield metrics
+    except Exception:
+        metrics.failed = True
+        raise
+    finally:
+        metrics.duration += time.perf_counter() - start
+        debug(
+            f'{stage} {table_name}: {metrics.duration:.3f}s, {metrics.rows_in} rows in, {metrics.rows_out} rows out, '
+            f'{metrics.bytes} bytes, {metrics.rows_dropped} dropped'
+        )
+
+
+def write_reports():
+    finished_at = time.time()
+
+    with _lock:
+        stages = list(_stages)
+
+    try:
+        _METRICS_DIR.mkdir(parents = True, exist_ok = True)
+        _write_atomically(_METRICS_DIR / _REPORT_FILE_NAME, _render_report(stages = stages, finished_at = finished_at))
+        _write_atomically(
+            _METRICS_DIR / _PROMETHEUS_FILE_NAME,
+            _render_prometheus(stages = stages, finished_at = finished_at),
+        )
+        info(f'Wrote ingest metrics for {len(stages)} stages to {_METRICS_DIR}')
+    except Exception as e:
+        error(f'Failed to write ingest metrics: {e}')
+
+
+def write_json_report(file_name, payload):
+    try:
+        _METRICS_DIR.mkdir(parents = True, exist_ok = True)
+        _write_atomically(_METRICS_DIR / file_name, json.dumps(payload, indent = 2, default = str))
+        info(f'Wrote {file_name} to {_METRICS_DIR}')
+    except Exception as e:
+        error(f'Failed to write {file_name}: {e}')
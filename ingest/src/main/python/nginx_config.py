@@ -0,0 +1,80 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import os
+import pathlib
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+_NGINX_CONF_DIR = os.getenv('SPRITE_NGINX_CONF_DIR')
+_NGINX_CONF_FILE = 'sprites.conf'
+
+_SPRITE_SERVER_ROOT = os.getenv('SPRITE_SERVER_ROOT', '/usr/share/nginx/html')
+_SPRITE_CACHE_MAX_AGE = int(os.getenv('SPRITE_CACHE_MAX_AGE', 365 * 24 * 60 * 60))
+
+_OPEN_FILE_CACHE_MIN = 1000
+
+
+# Utilities
+
+def _render_config(file_count):
+    # Room for every sprite and its .gz sibling, so the hot set never gets evicted
+    open_file_cache_max = max(_OPEN_FILE_CACHE_MIN, file_count * 2)
+
+    return f"""# Generated by the ingest service, changes are overwritten on the next ingest
+server {{
+    listen 80;
+    listen [::]:80;
+    server_name _;
+
+    root {_SPRITE_SERVER_ROOT};
+
+    gzip_static on;
+    gzip_vary on;
+
+    open_file_cache max={open_file_cache_max} inactive=10m;
+    open_file_cache_valid 10m;
+    open_file_cache_min_uses 1;
+    open_file_cache_errors on;
+
+    location / {{
+        add_header Cache-Control "public, max-age={_SPRITE_CACHE_MAX_AGE}, immutable";
+        try_files $uri =404;
+    }}
+}}
+"""
+
+
+# Functions
+
+def write_nginx_config(file_count):
+    if not _NGINX_CONF_DIR:
+        debug('No SPRITE_NGINX_CONF_DIR set, skipping nginx config')
+        return
+
+    conf_dir = pathlib.Path(_NGINX_CONF_DIR)
+    conf_dir.mkdir(parents = True, exist_ok = True)
+
+    path = conf_dir / _NGINX_CONF_FILE
+    tmp_path = conf_dir / f'.{_NGINX_CONF_FILE}.tmp'
+
+    tmp_path.write_text(_render_config(file_count), encoding = 'utf-8')
+    os.replace(tmp_path, path)
+
+    info(f'Wrote nginx config to {path}')
@@ -0,0 +1,135 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import io
+import os
+import queue
+import threading
+import time
+from logger import debug, info, warning, error, critical
+from metrics import record
+
+# Constants
+
+_PIPELINE_DEPTH = int(os.getenv('CSV_PIPELINE_DEPTH', 16))
+
+# How long a blocked producer waits before checking whether it was cancelled
+_PUT_TIMEOUT = 0.1
+
+_END = object()
+
+
+# Classes
+
+class _Failure:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class ChunkPipeline:
+    def __init__(self, name, produce, depth = _PIPELINE_DEPTH):
+        self.name = name
+        self._produce = produce
+        self._queue = queue.Queue(maxsize = depth)
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target = self._run, name = f'pipeline-{name}', daemon = True)
+        self._metrics = record('pipeline_stall', name)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def reader(self):
+        return PipelineReader(self)
+
+    def cancel(self):
+        self._cancelled.set()
+        self._thread.join()
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout = _PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _run(self):
+        try:
+            for chunk in self._produce():
+                if not self._put(chunk):
+                    debug(f'Pipeline {self.name} cancelled')
+                    return
+
+            self._put(_END)
+        except Exception as e:
+            self._put(_Failure(e))
+
+    def take(self):
+        # Time spent here is time COPY sat idle waiting on the parser
+        start = time.perf_counter()
+        item = self._queue.get()
+        self._metrics.duration += time.perf_counter() - start
+
+        if isinstance(item, _Failure):
+            self._metrics.failed = True
+            raise item.exception
+
+        if item is not _END:
+            self._metrics.rows_in += 1
+            self._metrics.rows_out += 1
+            self._metrics.bytes += len(item)
+
+        return item
+
+
+class PipelineReader(io.TextIOBase):
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+        self._buffer = ''
+        self._exhausted = False
+
+    def readable(self):
+        return True
+
+    def read(self, size = -1):
+        if size is None or size < 0:
+            size = None
+
+        chunks = [self._buffer]
+        buffered = len(self._buffer)
+
+        while not self._exhausted and (size is None or buffered < size):
+            chunk = self._pipeline.take()
+
+            if chunk is _END:
+                self._exhausted = True
+            else:
+                chunks.append(chunk)
+                buffered += len(chunk)
+
+        data = ''.join(chunks)
+
+        if size is not None and len(data) > size:
+            data, self._buffer = data[:size], data[size:]
+        else:
+            self._buffer = ''
+
+        return data
@@ -0,0 +1,188 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from logger import debug, info, warning, error, critical
+
+# Classes
+
+# Tasks sharing a lock never run at the same time, e.g. to keep DDL on the same table from queueing on each other
+Task = namedtuple('Task', ['name', 'block', 'depends_on', 'locks'], defaults = ((), ()))
+
+
+# Utilities
+
+def _critical_path(tasks, durations):
+    finish_times = { }
+    predecessors = { }
+
+    def finish_time(name):
+        if name not in finish_times:
+            start = 0.0
+            for dependency in tasks[name].depends_on:
+                if finish_time(dependency) > start:
+                    start = finish_time(dependency)
+                    predecessors[name] = dependency
+            finish_times[name] = start + durations.get(name, 0.0)
+        return finish_times[name]
+
+    if not tasks:
+        return 0.0, []
+
+    last = max(tasks, key = finish_time)
+
+    path = [last]
+    while path[-1] in predecessors:
+        path.append(predecessors[path[-1]])
+
+    return finish_times[last], list(reversed(path))
+
+
+def _validate_graph(tasks):
+    for task in tasks.values():
+        for dependency in task.depends_on:
+            if dependency not in tasks:
+                raise ValueError(f'Task {task.name} depends on unknown task {dependency}')
+
+    visiting = set()
+    visited = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f'Dependency cycle detected at task {name}')
+
+        visiting.add(name)
+        for dependency in tasks[name].depends_on:
+            visit(dependency)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in tasks:
+        visit(name)
+
+
+# Functions
+
+def dependency_order(tasks):
+    tasks = { task.name: task for task in tasks }
+    _validate_graph(tasks)
+
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        for dependency in tasks[name].depends_on:
+            visit(dependency)
+        ordered.append(name)
+
+    for name in tasks:
+        visit(name)
+
+    return ordered
+
+
+def run_task_graph(pool, tasks, commit_each = False):
+    tasks = { task.name: task for task in tasks }
+    _validate_graph(tasks)
+
+    worker_state = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def get_connection():
+        conn = getattr(worker_state, 'conn', None)
+
+        if conn is None:
+            conn = pool.getconn()
+            worker_state.conn = conn
+            with connections_lock:
+                connections.append(conn)
+
+        return conn
+
+    def run(task):
+        conn = get_connection()
+        start = time.perf_counter()
+
+        try:
+            task.block(conn)
+        except Exception:
+            if commit_each:
+                conn.rollback()
+            raise
+
+        if commit_each:
+            conn.commit()
+
+        return time.perf_counter() - start
+
+    pending = dict(tasks)
+    settled = set()
+    running = { }
+    locked = set()
+    durations = { }
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers = pool.maxconn) as executor:
+        while pending or running:
+            for name, task in list(pending.items()):
+                if len(running) >= pool.maxconn:
+                    break
+
+                if all(dependency in settled for dependency in task.depends_on) and locked.isdisjoint(task.locks):
+                    debug(f'Scheduling {name}')
+                    running[executor.submit(run, task)] = task
+                    locked.update(task.locks)
+                    del pending[name]
+
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+
+            for future in finished:
+                task = running.pop(future)
+                settled.add(task.name)
+                locked.difference_update(task.locks)
+
+                try:
+                    durations[task.name] = future.result()
+                    debug(f'Finished {task.name} in {durations[task.name]:.2f}s')
+                except Exception as e:
+                    error(f'Task {task.name} failed: {e}')
+
+    for conn in connections:
+        try:
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+
+    wall_time = time.perf_counter() - start
+    critical_time, critical_path = _critical_path(tasks, durations)
+
+    info(
+        f'Ran {len(tasks)} tasks on {len(connections)} connections in {wall_time:.2f}s '
+        f'(total work {sum(durations.values()):.2f}s)'
+    )
+    info(f'Critical path {critical_time:.2f}s: {" -> ".join(critical_path)}')
+
+    return [name for name in tasks if name not in durations]
@@ -0,0 +1,200 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import datetime
+import os
+from psycopg2 import sql
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+SHADOW_LOAD = os.getenv('INGEST_SHADOW_LOAD', 'false').lower() == 'true'
+ROLLBACK = os.getenv('INGEST_ROLLBACK', 'false').lower() == 'true'
+
+LIVE_SCHEMA = os.getenv('INGEST_LIVE_SCHEMA', 'public')
+SHADOW_SCHEMA = f'{LIVE_SCHEMA}_shadow'
+
+_RETIRED_PREFIX = f'{LIVE_SCHEMA}_prev_'
+_KEEP_RETIRED = int(os.getenv('INGEST_SHADOW_KEEP', 2))
+
+# A table may lose at most this share of its live rows before the swap is refused
+_MAX_SHRINK = float(os.getenv('INGEST_SHADOW_MAX_SHRINK', 0.1))
+
+_SWAP_LOCK_TIMEOUT = os.getenv('INGEST_SHADOW_LOCK_TIMEOUT', '5s')
+
+# Bookkeeping whose size depends on which stages ran rather than on the data, never compared
+_UNVALIDATED_TABLES = { 'ingest_checkpoint' }
+
+
+# Utilities
+
+def _schema_exists(cur, schema):
+    cur.execute('SELECT EXISTS (SELECT 1 FROM pg_namespace WHERE nspname = %s);', (schema,))
+    return cur.fetchone()[0]
+
+
+def _count_rows(cur, schema):
+    cur.execute(
+        """
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+        ORDER BY c.relname;
+        """,
+        (schema,),
+    )
+
+    counts = { }
+    for (table_name,) in cur.fetchall():
+        cur.execute(sql.SQL('SELECT count(*) FROM {}.{};').format(sql.Identifier(schema), sql.Identifier(table_name)))
+        counts[table_name] = cur.fetchone()[0]
+
+    return counts
+
+
+def _load_schema_objects(cur, schema):
+    cur.execute(
+        """
+        SELECT con.conname
+        FROM pg_constraint con
+        JOIN pg_namespace n ON n.oid = con.connamespace
+        WHERE n.nspname = %s
+        UNION
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind = 'i';
+        """,
+        (schema, schema),
+    )
+
+    return { row[0] for row in cur.fetchall() }
+
+
+def _retired_schemas(cur):
+    cur.execute(
+        """
+        SELECT nspname FROM pg_namespace WHERE starts_with(nspname, %s) ORDER BY nspname DESC;
+        """,
+        (_RETIRED_PREFIX,),
+    )
+
+    return [row[0] for row in cur.fetchall()]
+
+
+def _rename_schema(cur, schema, new_name):
+    cur.execute(sql.SQL('ALTER SCHEMA {} RENAME TO {};').format(sql.Identifier(schema), sql.Identifier(new_name)))
+
+
+def _retired_name():
+    return f'{_RETIRED_PREFIX}{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H%M%S%f}'
+
+
+def _swap(conn, incoming):
+    retired = _retired_name()
+
+    # Both renames commit together, readers see either the old or the new schema and nothing in between
+    with conn.cursor() as cur:
+        cur.execute('SELECT set_config(%s, %s, true);', ('lock_timeout', _SWAP_LOCK_TIMEOUT))
+
+        if _schema_exists(cur, LIVE_SCHEMA):
+            _rename_schema(cur, LIVE_SCHEMA, retired)
+        else:
+            retired = None
+
+        _rename_schema(cur, incoming, LIVE_SCHEMA)
+
+    conn.commit()
+
+    return retired
+
+
+def _prune_retired(conn):
+    with conn.cursor() as cur:
+        for schema in _retired_schemas(cur)[_KEEP_RETIRED:]:
+            info(f'Dropping retired schema {schema}')
+            cur.execute(sql.SQL('DROP SCHEMA {} CASCADE;').format(sql.Identifier(schema)))
+
+    conn.commit()
+
+
+# Functions
+
+def prepare_shadow_schema(conn):
+    with conn.cursor() as cur:
+        # A leftover shadow is from a load that failed validation or crashed, it never went live
+        # Its ingest_checkpoint and ingest_manifest rows go with it, a shadow load never resumes from them
+        cur.execute(sql.SQL('DROP SCHEMA IF EXISTS {} CASCADE;').format(sql.Identifier(SHADOW_SCHEMA)))
+        cur.execute(sql.SQL('CREATE SCHEMA {};').format(sql.Identifier(SHADOW_SCHEMA)))
+        cur.execute(sql.SQL('GRANT USAGE ON SCHEMA {} TO PUBLIC;').format(sql.Identifier(SHADOW_SCHEMA)))
+
+    conn.commit()
+    info(f'Loading into shadow schema {SHADOW_SCHEMA}')
+
+    return SHADOW_SCHEMA
+
+
+def validate_shadow_schema(conn, expected_objects):
+    with conn.cursor() as cur:
+        shadow_counts = _count_rows(cur, SHADOW_SCHEMA)
+        shadow_objects = _load_schema_objects(cur, SHADOW_SCHEMA)
+        live_counts = _count_rows(cur, LIVE_SCHEMA) if _schema_exists(cur, LIVE_SCHEMA) else { }
+
+    conn.commit()
+
+    # Checked even without a live schema to compare against, the first swap must not go live without post ingest
+    problems = [f'{name} was not built' for name in sorted(set(expected_objects) - shadow_objects)]
+    for table_name, live_count in live_counts.items():
+        shadow_count = shadow_counts.get(table_name)
+
+        if table_name in _UNVALIDATED_TABLES:
+            continue
+        elif shadow_count is None:
+            problems.append(f'{table_name} is missing')
+        elif shadow_count < live_count * (1 - _MAX_SHRINK):
+            problems.append(f'{table_name} has {shadow_count} rows, down from {live_count}')
+
+    for table_name, shadow_count in shadow_counts.items():
+        debug(f'Shadow {table_name}: {shadow_count} rows (live {live_counts.get(table_name, 0)})')
+
+    if problems:
+        error(f'Shadow schema {SHADOW_SCHEMA} failed validation: {"; ".join(problems)}')
+        return False
+
+    info(f'Shadow schema {SHADOW_SCHEMA} validated, {sum(shadow_counts.values())} rows in {len(shadow_counts)} tables')
+    return True
+
+
+def swap_shadow_schema(conn):
+    retired = _swap(conn = conn, incoming = SHADOW_SCHEMA)
+    info(f'Swapped {SHADOW_SCHEMA} in as {LIVE_SCHEMA}' + (f', previous data kept as {retired}' if retired else ''))
+
+    _prune_retired(conn)
+
+
+def rollback_schema(conn):
+    with conn.cursor() as cur:
+        retired = _retired_schemas(cur)
+
+    if not retired:
+        raise RuntimeError(f'No retired schema to roll back to, expected one named {_RETIRED_PREFIX}*')
+
+    # The schema being rolled back from is retired under a new, newer name so it can be rolled forward again
+    replaced = _swap(conn = conn, incoming = retired[0])
+    info(f'Rolled {LIVE_SCHEMA} back to {retired[0]}' + (f', replaced data kept as {replaced}' if replaced else ''))
@@ -0,0 +1,150 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import hashlib
+import io
+import os
+import pathlib
+import shutil
+import tarfile
+import time
+import zipfile
+from logger import debug, info, warning, error, critical
+from metrics import measure
+
+# Constants
+
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.zip')
+
+# Members are taken relative to the first directory with this name, e.g. sprites-master/sprites/pokemon/1.png
+# becomes pokemon/1.png. An empty root takes them relative to the archive itself.
+_ARCHIVE_ROOT = os.getenv('SPRITE_ARCHIVE_ROOT', 'sprites')
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+# Utilities
+
+def _iter_tar_members(path):
+    # Stream mode reads the archive front to back once, a member's data is only readable until the next one
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, float(member.mtime), lambda member = member: archive.extractfile(member)
+
+
+def _iter_zip_members(path):
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            if not member.is_dir():
+                mtime = time.mktime(member.date_time + (0, 0, -1))
+                yield member.filename, member.file_size, mtime, lambda member = member: archive.open(member)
+
+
+def _relative_parts(name):
+    parts = [part for part in pathlib.PurePosixPath(name).parts if part not in ('', '.')]
+
+    if _ARCHIVE_ROOT:
+        if _ARCHIVE_ROOT not in parts:
+            return None
+        parts = parts[parts.index(_ARCHIVE_ROOT) + 1:]
+
+    # Never let a member escape the target directory
+    if not parts or '..' in parts or parts[0].startswith('/'):
+        return None
+
+    return tuple(parts)
+
+
+def _is_current(path, size, mtime):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+
+    return stat.st_size == size and stat.st_mtime == mtime
+
+
+def _read_known(open_member, path, size, known):
+    # Only worth reading when the snapshot hashed this path at this size and the file on disk still has that size
+    if known is None or known[0] != size:
+        return None
+
+    try:
+        if os.stat(path).st_size != size:
+            return None
+    except FileNotFoundError:
+        return None
+
+    with open_member() as source:
+        return source.read()
+
+
+def _extract(open_member, path, mtime):
+    path.parent.mkdir(parents = True, exist_ok = True)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+
+    with open_member() as source, open(tmp_path, 'wb') as target:
+        shutil.copyfileobj(source, target, _COPY_BUFFER_SIZE)
+
+    # Stamped with the archive's mtime so the next pass, and the sprite snapshot, see it as unchanged
+    os.utime(tmp_path, (mtime, mtime))
+    os.replace(tmp_path, path)
+
+
+# Functions
+
+def is_archive(path):
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def iter_archive(path, target_dir, known_files = None):
+    members = _iter_zip_members(path) if str(path).lower().endswith('.zip') else _iter_tar_members(path)
+    known_files = known_files or { }
+
+    with measure('extract', 'pokemon_sprite') as metrics:
+        for name, size, mtime, open_member in members:
+            parts = _relative_parts(name)
+            if parts is None:
+                continue
+
+            metrics.rows_in += 1
+            target_path = target_dir.joinpath(*parts)
+
+            if _is_current(target_path, size, mtime):
+                yield parts, size, mtime
+                continue
+
+            # A member still hashing to what the snapshot recorded is left alone, e.g. a hardlinked duplicate
+            known = known_files.get('/'.join(parts))
+            data = _read_known(open_member = open_member, path = target_path, size = size, known = known)
+            if data is not None and hashlib.sha256(data).hexdigest() == known[1]:
+                yield parts, size, mtime
+                continue
+
+            # A tar stream cannot be read twice, a member read for its hash is written from memory
+            if data is not None:
+                open_member = lambda data = data: io.BytesIO(data)
+
+            _extract(open_member = open_member, path = target_path, mtime = mtime)
+            metrics.rows_out += 1
+            metrics.bytes += size
+
+            yield parts, size, mtime
+
+    info(f'Extracted {metrics.rows_out} of {metrics.rows_in} archive members, the rest were already up to date')
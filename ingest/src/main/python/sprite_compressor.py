@@ -0,0 +1,110 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+from logger import debug, info, warning, error, critical
+
+# Constants
+
+_COMPRESS_WORKERS = int(os.getenv('SPRITE_COMPRESS_WORKERS', os.cpu_count() or 1))
+_COMPRESS_BATCH_SIZE = 128
+
+# Raster sprites are already compressed, gzip only pays off for the text based formats
+COMPRESSIBLE_SUFFIXES = ('.svg',)
+
+_GZIP_SUFFIX = '.gz'
+_GZIP_LEVEL = 9
+
+
+# Utilities
+
+def _compressed_path(path):
+    return path + _GZIP_SUFFIX
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _compress_file(path):
+    compressed_path = _compressed_path(path)
+    source_stat = os.stat(path)
+
+    # The .gz carries the mtime of its source, a mismatch means the source changed since it was written
+    try:
+        if os.stat(compressed_path).st_mtime_ns == source_stat.st_mtime_ns:
+            return None
+    except FileNotFoundError:
+        pass
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # A fixed gzip mtime keeps the output identical across runs for the same source
+    compressed = gzip.compress(data, compresslevel = _GZIP_LEVEL, mtime = 0)
+
+    # nginx prefers the .gz whenever it exists, so one that saves nothing must not exist at all
+    if len(compressed) >= len(data):
+        _remove_file(compressed_path)
+        return 0
+
+    tmp_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(compressed_path)}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+
+    os.utime(tmp_path, ns = (source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    os.replace(tmp_path, compressed_path)
+
+    return len(compressed)
+
+
+def _compress_batch(paths):
+    return [_compress_file(path) for path in paths]
+
+
+# Functions
+
+def compress_files(paths, workers = _COMPRESS_WORKERS):
+    batches = [paths[i:i + _COMPRESS_BATCH_SIZE] for i in range(0, len(paths), _COMPRESS_BATCH_SIZE)]
+
+    if workers <= 1 or len(batches) <= 1:
+        results = [result for batch in batches for result in _compress_batch(batch)]
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = [result for batch in executor.map(_compress_batch, batches) for result in batch]
+
+    written = [size for size in results if size]
+    info(
+        f'Compressed {len(written)} sprites into {sum(written)} bytes, '
+        f'{results.count(None)} were already up to date'
+    )
+
+    return len(written), sum(written)
+
+
+def remove_compressed(paths):
+    removed = sum(_remove_file(_compressed_path(path)) for path in paths)
+    debug(f'Removed {removed} compressed sprites without a source')
+
+    return removed
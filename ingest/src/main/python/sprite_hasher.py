@@ -0,0 +1,113 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import hashlib
+import mmap
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from logger import debug, info, warning, error, critical
+from image_header import read_dimensions
+
+# Constants
+
+_HASH_WORKERS = int(os.getenv('SPRITE_HASH_WORKERS', os.cpu_count() or 1))
+
+# Sprites are small, batching keeps the pool from spending more time on pickling than on reading
+_HASH_BATCH_SIZE = 512
+
+
+# Classes
+
+FileInfo = namedtuple('FileInfo', ['content_hash', 'width', 'height', 'frame_count'])
+
+
+# Utilities
+
+def _inspect_file(path):
+    with open(path, 'rb') as f:
+        # mmap refuses empty files, and there is nothing to read from them anyway
+        if os.fstat(f.fileno()).st_size == 0:
+            return FileInfo(hashlib.sha256().hexdigest(), None, None, None)
+
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            try:
+                dimensions = read_dimensions(data)
+            except (IndexError, ValueError, struct.error):
+                dimensions = None
+
+            width, height, frame_count = dimensions or (None, None, None)
+
+            return FileInfo(hashlib.sha256(data).hexdigest(), width, height, frame_count)
+
+
+def _inspect_batch(paths):
+    return [_inspect_file(path) for path in paths]
+
+
+def _link_duplicate(canonical_path, duplicate_path):
+    if os.path.samefile(canonical_path, duplicate_path):
+        return False
+
+    # Link next to the duplicate first so the swap itself is a single atomic rename
+    tmp_path = os.path.join(os.path.dirname(duplicate_path), f'.{os.path.basename(duplicate_path)}.link')
+    os.link(canonical_path, tmp_path)
+
+    try:
+        os.replace(tmp_path, duplicate_path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+    return True
+
+
+# Functions
+
+def inspect_files(paths, workers = _HASH_WORKERS):
+    batches = [paths[i:i + _HASH_BATCH_SIZE] for i in range(0, len(paths), _HASH_BATCH_SIZE)]
+
+    if workers <= 1 or len(batches) <= 1:
+        return [file_info for batch in batches for file_info in _inspect_batch(batch)]
+
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        return [file_info for file_infos in executor.map(_inspect_batch, batches) for file_info in file_infos]
+
+
+def hardlink_duplicates(paths_by_hash):
+    linked = []
+    saved_bytes = 0
+
+    for paths in paths_by_hash.values():
+        if len(paths) < 2:
+            continue
+
+        canonical_path, *duplicate_paths = sorted(paths)
+
+        for duplicate_path in duplicate_paths:
+            try:
+                if _link_duplicate(canonical_path = canonical_path, duplicate_path = duplicate_path):
+                    linked.append(duplicate_path)
+                    saved_bytes += os.path.getsize(duplicate_path)
+            except OSError as e:
+                warning(f'Could not hardlink {duplicate_path} to {canonical_path}: {e}')
+
+    info(f'Hardlinked {len(linked)} duplicate sprites, saving {saved_bytes} bytes')
+
+    return linked
@@ -20,18 +20,35 @@ import os
 import re
 import shutil
 import subprocess
-import io
 import csv
 import pathlib
-from typing import Optional, Tuple
+from collections import namedtuple
 from logger import debug, info, warning, error, critical
-from csv_utils import ingest_csv
+from csv_utils import ingest_csv, RowStream
+from metrics import measure
+from sprite_hasher import inspect_files, hardlink_duplicates, FileInfo
+from sprite_compressor import compress_files, remove_compressed, COMPRESSIBLE_SUFFIXES
+from nginx_config import write_nginx_config
+from sprite_archive import is_archive, iter_archive
+from checkpoint import savepoint
 
 # Constants
 
-_SPRITES_DIR = pathlib.Path(os.getenv('SPRITE_DIR', 'sprites'))
+_SPRITE_SOURCE = pathlib.Path(os.getenv('SPRITE_DIR', 'sprites'))
 
-_IMAGE_GLOBS = ['*.png', '*.gif', '*.svg']
+# SPRITE_DIR may also point at a .tar, .tar.gz or .zip of the sprite repo, which is extracted into SPRITE_EXTRACT_DIR
+_SPRITE_ARCHIVE = _SPRITE_SOURCE if is_archive(_SPRITE_SOURCE) else None
+_SPRITES_DIR = pathlib.Path(os.getenv('SPRITE_EXTRACT_DIR', 'sprites')) if _SPRITE_ARCHIVE else _SPRITE_SOURCE
+_CSV_DIR = pathlib.Path(os.getenv('POKEAPI_CSV_DIR', 'csv'))
+
+_DELTA_INGEST = os.getenv('SPRITE_DELTA_INGEST', 'false').lower() == 'true'
+_HARDLINK_DUPLICATES = os.getenv('SPRITE_HARDLINK_DUPLICATES', 'false').lower() == 'true'
+_PRECOMPRESS = os.getenv('SPRITE_PRECOMPRESS', 'false').lower() == 'true'
+
+_IMAGE_SUFFIXES = ('.png', '.gif', '.svg')
+
+# Bump whenever the rows derived from a sprite change, so checkpoints taken by older code are not trusted
+_MAPPER_VERSION = 1
 
 _FLAG_SHINY = 'is_shiny'
 _FLAG_FEMALE = 'is_female'
@@ -43,11 +60,105 @@ _FLAG_LOW_RES = 'is_low_res'
 
 _HANDLED_DIRS = {'versions', 'other'}
 
+# Matches the whole file name so the stem never has to be split off, e.g. 25.png, 25-cap.png or 10001_f.gif
+_FILE_NAME_REGEX = re.compile(r'^(\d+)(?:[-_]?(.+?))?\.(?:png|gif|svg)$')
+
+_OFFICIAL_DIR_PARTS = ('other', 'official-artwork')
+_OFFICIAL_SHINY_DIR_PARTS = ('other', 'official-artwork', 'shiny')
+
+# Tables referencing pokemon_sprite.path, these have to be cleared before the sprite itself
+_SPRITE_CHILD_TABLES = [
+    'pokemon_official_sprite',
+    'pokemon_default_sprite',
+    'pokemon_misc_sprite',
+    'pokemon_version_sprite',
+]
+
+# Mirrors the foreign keys in 03_constraint so referenced tables are loaded before the tables pointing at them
+_SPRITE_TABLE_DEPENDENCIES = {
+    'pokemon_sprite'         : ['pokemon'],
+    'pokemon_official_sprite': ['pokemon_sprite'],
+    'pokemon_default_sprite' : ['pokemon_sprite'],
+    'pokemon_misc_sprite'    : ['pokemon_sprite'],
+    'pokemon_version_sprite' : ['pokemon_sprite', 'version'],
+}
+
+
+# Classes
+
+Sprite = namedtuple(
+    'Sprite',
+    [
+        'path', 'size', 'mtime', 'pokemon_id', 'variant', 'flags', 'is_default', 'official_shiny', 'misc_category',
+        'version_ids', 'content_hash', 'width', 'height', 'frame_count',
+    ],
+    defaults = (None, None, None, None),
+)
+
+# Everything about a sprite that follows from its directory alone
+SpriteDirectory = namedtuple(
+    'SpriteDirectory',
+    ['prefix', 'flags', 'is_default', 'official_shiny', 'misc_category', 'version_ids'],
+)
+
+
+class SpriteClassifier:
+    def __init__(self, version_lookup):
+        version_names = sorted(version_lookup.keys(), key = len, reverse = True)
+
+        self._version_lookup = version_lookup
+        self._version_regex = re.compile('|'.join(re.escape(v) for v in version_names))
+        self._directories = { }
+
+    def classify(self, dir_parts):
+        directory = self._directories.get(dir_parts)
+
+        if directory is None:
+            directory = _classify_directory(
+                dir_parts = dir_parts,
+                version_lookup = self._version_lookup,
+                version_regex = self._version_regex,
+            )
+            self._directories[dir_parts] = directory
+
+        return directory
+
+    def sprite(self, dir_parts, file_name, size, mtime):
+        directory = self.classify(dir_parts)
+        match = _FILE_NAME_REGEX.match(file_name)
+
+        if match is None:
+            warning(f'Failed to parse id for {directory.prefix}{file_name}')
+            return None
+
+        pid = int(match.group(1))
+        if pid <= 0:
+            return None
+
+        return Sprite(
+            path = directory.prefix + file_name,
+            size = size,
+            mtime = mtime,
+            pokemon_id = pid,
+            variant = match.group(2),
+            flags = directory.flags,
+            is_default = directory.is_default,
+            official_shiny = directory.official_shiny,
+            misc_category = directory.misc_category,
+            version_ids = directory.version_ids,
+        )
+
+
+# Variables
+
+# Sprites scanned to fingerprint the sprites stage, handed to the stage itself so the tree is only listed once
+_scan_cache = { }
+
 
 # Utilities
 
 def _load_version_lookup():
-    path = pathlib.Path('csv') / 'versions.csv'
+    path = _CSV_DIR / 'versions.csv'
 
     with path.open('r', encoding = 'utf-8') as f:
         reader = csv.DictReader(f)
@@ -55,60 +166,285 @@ def _load_version_lookup():
 
 
 def _extract_flags(parts):
+    parts = set(parts)
+
     return {
         _FLAG_SHINY      : 'shiny' in parts,
         _FLAG_FEMALE     : 'female' in parts,
         _FLAG_BACK       : 'back' in parts,
-        _FLAG_GREY       : 'grey' in parts,
+        _FLAG_GREY       : 'grey' in parts or 'gray' in parts,
         _FLAG_TRANSPARENT: 'transparent' in parts,
         _FLAG_ANIMATED   : 'animated' in parts,
         _FLAG_LOW_RES    : 'lowres' in parts,
     }
 
 
-def _parse_id_and_variant(path: pathlib.Path) -> Optional[Tuple[int, Optional[str]]]:
-    try:
-        id_regex = re.compile(r'^(\d+)(?:[-_]?(.+))?$')
+def _scan_sprite_tree(base_dir):
+    pending = [()]
 
-        match = id_regex.match(path.stem)
+    while pending:
+        dir_parts = pending.pop()
+        files = []
 
-        if match is None:
-            warning(f'Failed to parse id for {path}')
-            return None
+        with os.scandir(base_dir.joinpath(*dir_parts)) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(dir_parts + (entry.name,))
+                elif entry.name.endswith(_IMAGE_SUFFIXES) and entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime))
+
+        yield dir_parts, files
+
+
+def _scan_sprite_archive(path, snapshot):
+    known_files = {
+        sprite_path: (size, file_info.content_hash)
+        for sprite_path, (size, mtime, file_info) in snapshot.items()
+        if file_info is not None
+    }
+
+    # Members are classified as they stream past, the archive is never walked a second time
+    for parts, size, mtime in iter_archive(path = path, target_dir = _SPRITES_DIR, known_files = known_files):
+        if len(parts) > 1 and parts[0] == 'pokemon' and parts[-1].endswith(_IMAGE_SUFFIXES):
+            yield parts[1:-1], parts[-1], size, mtime
+
+
+def _resolve_version_ids(dir_parts, version_lookup, version_regex):
+    if len(dir_parts) < 3 or dir_parts[0] != 'versions' or not dir_parts[1].startswith('generation'):
+        return ()
+
+    version_name = dir_parts[2]
+    if version_name == 'icons':
+        return ()
+
+    versions = version_regex.findall(version_name.lower())
+
+    if not versions:
+        if len(dir_parts) == 3:
+            warning(f'Unknown version name for path: {"/".join(dir_parts)}')
+        return ()
+
+    return tuple(version_lookup[version] for version in versions)
+
+
+def _classify_directory(dir_parts, version_lookup, version_regex):
+    if dir_parts == _OFFICIAL_DIR_PARTS:
+        official_shiny = False
+    elif dir_parts == _OFFICIAL_SHINY_DIR_PARTS:
+        official_shiny = True
+    else:
+        official_shiny = None
+
+    if len(dir_parts) > 1 and dir_parts[0] == 'other' and dir_parts[-1] != 'official-artwork':
+        misc_category = dir_parts[1]
+    else:
+        misc_category = None
+
+    return SpriteDirectory(
+        prefix = '/'.join(('pokemon', *dir_parts)) + '/',
+        flags = _extract_flags(dir_parts),
+        is_default = not any(part in _HANDLED_DIRS for part in dir_parts),
+        official_shiny = official_shiny,
+        misc_category = misc_category,
+        version_ids = _resolve_version_ids(
+            dir_parts = dir_parts,
+            version_lookup = version_lookup,
+            version_regex = version_regex,
+        ),
+    )
+
+
+def _collect_sprites(snapshot):
+    classifier = SpriteClassifier(version_lookup = _load_version_lookup())
+
+    if _SPRITE_ARCHIVE is not None:
+        files = _scan_sprite_archive(path = _SPRITE_ARCHIVE, snapshot = snapshot)
+    else:
+        files = (
+            (dir_parts, *file)
+            for dir_parts, dir_files in _scan_sprite_tree(_SPRITES_DIR / 'pokemon')
+            for file in dir_files
+        )
+
+    sprites = []
+    for dir_parts, file_name, size, mtime in files:
+        sprite = classifier.sprite(dir_parts = dir_parts, file_name = file_name, size = size, mtime = mtime)
+
+        if sprite is not None:
+            sprites.append(sprite)
+
+    debug(f'Scanned {len(sprites)} sprite files')
+
+    return sprites
+
+
+def _scan_sprites(snapshot = None):
+    cached = _scan_cache.pop('sprites', None)
+    if cached is not None:
+        debug('Reusing the sprites scanned to fingerprint this stage')
+        return cached
+
+    with measure('scan', 'pokemon_sprite') as metrics:
+        sprites = _collect_sprites(snapshot = snapshot or { })
+        metrics.rows_out = len(sprites)
+
+    return sprites
+
+
+def _load_snapshot(conn):
+    with conn.cursor() as cur:
+        # Hash and byte_size are only set once a sprite has been inspected, rows from before that get inspected again
+        cur.execute(
+            """
+            SELECT s.path, s.size_bytes, s.mtime, s.content_hash, p.width, p.height, p.frame_count, p.byte_size
+            FROM sprite_snapshot s
+            LEFT JOIN pokemon_sprite p ON p.path = s.path;
+            """
+        )
+
+        return {
+            path: (
+                size,
+                mtime,
+                FileInfo(content_hash, width, height, frame_count)
+                if content_hash is not None and byte_size is not None else None,
+            )
+            for path, size, mtime, content_hash, width, height, frame_count, byte_size in cur.fetchall()
+        }
+
+
+def _inspect_sprites(sprites, snapshot):
+    inspected = []
+    pending = []
+
+    # Unchanged files keep the hash and header from the last snapshot, only new or modified ones are read
+    for sprite in sprites:
+        size, mtime, file_info = snapshot.get(sprite.path, (None, None, None))
+
+        if file_info is not None and (size, mtime) == (sprite.size, sprite.mtime):
+            inspected.append(sprite._replace(**file_info._asdict()))
         else:
-            pid, variant = match.groups()
-            converted_pid = int(pid)
+            pending.append(sprite)
+
+    with measure('inspect', 'pokemon_sprite') as metrics:
+        file_infos = inspect_files([str(_SPRITES_DIR / sprite.path) for sprite in pending])
+        metrics.rows_in = len(pending)
+        metrics.rows_out = len(file_infos)
+        metrics.bytes = sum(sprite.size for sprite in pending)
+
+    info(f'Inspected {len(pending)} sprites, reused {len(inspected)} from the last snapshot')
+
+    return inspected + [
+        sprite._replace(**file_info._asdict()) for sprite, file_info in zip(pending, file_infos)
+    ]
+
+
+def _hardlink_sprites(sprites):
+    paths_by_hash = { }
+    for sprite in sprites:
+        # Never inspected, sharing no hash says nothing about sharing content
+        if sprite.content_hash is None:
+            continue
+
+        paths_by_hash.setdefault(sprite.content_hash, []).append(str(_SPRITES_DIR / sprite.path))
+
+    linked = set(hardlink_duplicates(paths_by_hash))
+
+    # A relinked file takes over the stat of its canonical file, keep the snapshot in line with the disk
+    relinked = []
+    for sprite in sprites:
+        path = str(_SPRITES_DIR / sprite.path)
+
+        if path in linked:
+            stat = os.stat(path)
+            sprite = sprite._replace(size = stat.st_size, mtime = stat.st_mtime)
+
+        relinked.append(sprite)
+
+    return relinked
+
+
+def _compress_sprites(sprites, snapshot):
+    # A .gz outliving its source would still be served by gzip_static
+    current = { sprite.path for sprite in sprites }
+    remove_compressed(
+        [str(_SPRITES_DIR / path) for path in snapshot if path not in current and path.endswith(COMPRESSIBLE_SUFFIXES)],
+    )
+
+    pending = [sprite for sprite in sprites if sprite.path.endswith(COMPRESSIBLE_SUFFIXES)]
 
-            if converted_pid <= 0:
-                return None
-            else:
-                return converted_pid, variant or None
+    with measure('compress', 'pokemon_sprite') as metrics:
+        written, written_bytes = compress_files([str(_SPRITES_DIR / sprite.path) for sprite in pending])
+        metrics.rows_in = len(pending)
+        metrics.rows_out = written
+        metrics.bytes = written_bytes
 
-    except ValueError as e:
-        warning(f'Failed to parse id for {path.name}: {e}')
+
+def _delete_sprites(conn, paths):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE tmp_sprite_delta (path TEXT NOT NULL PRIMARY KEY) ON COMMIT DROP;
+            """
+        )
+
+        cur.copy_expert(
+            """
+            COPY tmp_sprite_delta FROM STDIN WITH CSV HEADER;
+            """,
+            RowStream(headers = ['path'], rows = ((path,) for path in paths)),
+        )
+
+        for table_name in _SPRITE_CHILD_TABLES:
+            cur.execute(
+                f"""
+                DELETE FROM {table_name} t USING tmp_sprite_delta d WHERE t.sprite_path = d.path;
+                """
+            )
+
+        cur.execute(
+            """
+            DELETE FROM pokemon_sprite t USING tmp_sprite_delta d WHERE t.path = d.path;
+            DELETE FROM sprite_snapshot t USING tmp_sprite_delta d WHERE t.path = d.path;
+            """
+        )
+
+
+def _plan_delta(snapshot, sprites):
+    if not snapshot:
+        warning('No sprite snapshot found, falling back to a full sprite ingest')
         return None
 
+    current = { sprite.path: (sprite.size, sprite.mtime) for sprite in sprites }
 
-def _is_valid_sprite(path: pathlib.Path) -> bool:
-    try:
-        parsed = _parse_id_and_variant(path)
+    removed = [path for path in snapshot if path not in current]
+    changed = [path for path, stat in current.items() if path in snapshot and snapshot[path][:2] != stat]
+    added = [sprite for sprite in sprites if sprite.path not in snapshot]
 
-        if parsed is None:
-            return False
-        else:
-            return True
-    except Exception:
-        return False
+    # Unchanged on disk but recorded before it was inspected, the sprite row only has to be upserted
+    refreshed = [
+        sprite for sprite in sprites
+        if sprite.path in snapshot and snapshot[sprite.path] == (*current[sprite.path], None)
+    ]
+
+    info(
+        f'Sprite delta: {len(added)} new, {len(changed)} changed, {len(removed)} removed, {len(refreshed)} refreshed, '
+        f'{len(sprites) - len(added) - len(changed) - len(refreshed)} unchanged'
+    )
 
+    changed_paths = set(changed)
 
-def _itr_image_files(path):
-    for suffix in _IMAGE_GLOBS:
-        yield from path.glob(suffix)
+    return removed + changed, added + [sprite for sprite in sprites if sprite.path in changed_paths] + refreshed
 
 
 # Functions
 
 def _ensure_sprite_repo_cloned():
+    if _SPRITE_ARCHIVE is not None:
+        info(f'Using sprite archive {_SPRITE_ARCHIVE}, skipping clone')
+        return
+
     if os.path.exists(_SPRITES_DIR) and os.listdir(_SPRITES_DIR):
         info('Sprite directory already exists, skipping clone')
         return
@@ -141,204 +477,189 @@ def _ensure_sprite_repo_cloned():
         raise RuntimeError(f'Failed to clone sprite repo: {e}')
 
 
-def _generate_sprites_csv():
-    base_dir = _SPRITES_DIR / 'pokemon'
-
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-
-    writer.writerow(['path', 'pokemon_id', 'variant'])
-
+def _generate_sprites_csv(sprites):
     subrows = 0
-    for child_dir in base_dir.glob('**/'):
-        for file in _itr_image_files(child_dir):
-            parsed = _parse_id_and_variant(file)
-
-            if parsed is None:
-                continue
-
-            pid, variant = parsed
-            if pid is None:
-                continue
-
-            path = file.relative_to(_SPRITES_DIR)
-
-            writer.writerow([str(path), pid, variant if variant else ''])
-            subrows += 1
+    for sprite in sprites:
+        yield (
+            sprite.path,
+            sprite.pokemon_id,
+            sprite.variant,
+            sprite.content_hash,
+            sprite.width,
+            sprite.height,
+            sprite.frame_count,
+            sprite.size,
+        )
+        subrows += 1
 
     debug(f'Found {subrows} sprites')
 
-    buffer.seek(0)
-    return buffer
-
-
-def _generate_official_artwork_csv():
-    official_dir = _SPRITES_DIR / 'pokemon' / 'other' / 'official-artwork'
-    shiny_dir = official_dir / 'shiny'
-
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(['sprite_path', 'is_shiny'])
 
+def _generate_official_artwork_csv(sprites):
     subrows = 0
-
-    # Base
-    for file in _itr_image_files(official_dir):
-        if file.parent == shiny_dir:
+    for sprite in sprites:
+        if sprite.official_shiny is None:
             continue
 
-        if not _is_valid_sprite(file):
-            continue
-
-        path = file.relative_to(_SPRITES_DIR)
-        writer.writerow([str(path), False])
-        subrows += 1
-
-    # Shiny
-    for file in _itr_image_files(shiny_dir):
-        if not _is_valid_sprite(file):
-            continue
-
-        path = file.relative_to(_SPRITES_DIR)
-        writer.writerow([str(path), True])
+        yield sprite.path, sprite.pokemon_id, sprite.variant, sprite.official_shiny
         subrows += 1
 
     debug(f'Found {subrows} official sprites')
 
-    buffer.seek(0)
-    return buffer
-
-
-def _generate_default_sprite_csv():
-    base_dir = _SPRITES_DIR / 'pokemon'
-
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(['sprite_path', 'is_shiny', 'is_female', 'is_back', 'is_low_res'])
 
+def _generate_default_sprite_csv(sprites):
     subrows = 0
-
-    for child_dir in base_dir.glob('**/'):
-        if any(part in _HANDLED_DIRS for part in child_dir.relative_to(_SPRITES_DIR).parts):
+    for sprite in sprites:
+        if not sprite.is_default:
             continue
 
-        for file in _itr_image_files(child_dir):
-            if not _is_valid_sprite(file):
-                continue
-
-            path = file.relative_to(_SPRITES_DIR)
+        flags = sprite.flags
 
-            flags = _extract_flags(path.parts)
-
-            writer.writerow(
-                [
-                    str(path),
-                    flags[_FLAG_SHINY],
-                    flags[_FLAG_FEMALE],
-                    flags[_FLAG_BACK],
-                    flags[_FLAG_LOW_RES],
-                ]
-            )
-            subrows += 1
+        yield (
+            sprite.path,
+            sprite.pokemon_id,
+            sprite.variant,
+            flags[_FLAG_SHINY],
+            flags[_FLAG_FEMALE],
+            flags[_FLAG_BACK],
+            flags[_FLAG_LOW_RES],
+        )
+        subrows += 1
 
     debug(f'Found {subrows} default sprites')
 
-    buffer.seek(0)
-    return buffer
-
-
-def _generate_misc_sprite_csv():
-    base_dir = _SPRITES_DIR / 'pokemon' / 'other'
-
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(['sprite_path', 'category', 'is_female', 'is_shiny', 'is_back'])
 
+def _generate_misc_sprite_csv(sprites):
     subrows = 0
-    for child_dir in base_dir.glob('**/'):
-        if child_dir.name == 'official-artwork':
+    for sprite in sprites:
+        if sprite.misc_category is None:
             continue
 
-        for file in _itr_image_files(child_dir):
-            if not _is_valid_sprite(file):
-                continue
-
-            base_dir_rel_path = file.relative_to(base_dir)
-            flags = _extract_flags(base_dir_rel_path.parts)
-            path = file.relative_to(_SPRITES_DIR)
-
-            writer.writerow(
-                [
-                    str(path),
-                    base_dir_rel_path.parts[0],
-                    flags[_FLAG_FEMALE],
-                    flags[_FLAG_SHINY],
-                    flags[_FLAG_BACK],
-                ],
-            )
-            subrows += 1
+        flags = sprite.flags
+
+        yield (
+            sprite.path,
+            sprite.pokemon_id,
+            sprite.variant,
+            sprite.misc_category,
+            flags[_FLAG_FEMALE],
+            flags[_FLAG_SHINY],
+            flags[_FLAG_BACK],
+        )
+        subrows += 1
 
     debug(f'Found {subrows} misc sprites')
 
-    buffer.seek(0)
-    return buffer
 
+def _generate_version_sprite_csv(sprites):
+    subrows = 0
+    for sprite in sprites:
+        flags = sprite.flags
+
+        for version_id in sprite.version_ids:
+            yield (
+                sprite.path,
+                sprite.pokemon_id,
+                sprite.variant,
+                version_id,
+                flags[_FLAG_SHINY],
+                flags[_FLAG_FEMALE],
+                flags[_FLAG_BACK],
+                flags[_FLAG_GREY],
+                flags[_FLAG_ANIMATED],
+                flags[_FLAG_TRANSPARENT],
+            )
+            subrows += 1
 
-def _generate_version_sprite_csv():
-    version_lookup = _load_version_lookup()
-    version_names = sorted(version_lookup.keys(), key = len, reverse = True)
-    version_regex = re.compile('|'.join(re.escape(v) for v in version_names))
+    debug(f'Found {subrows} version sprites')
 
-    base_dir = _SPRITES_DIR / 'pokemon' / 'versions'
 
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(
+# Table Specs
+
+# (label, table, headers, row generator, has generated primary, (conflict columns, update columns) to upsert on)
+_SPRITE_TABLES = [
+    (
+        'sprites',
+        'pokemon_sprite',
+        ['path', 'pokemon_id', 'variant', 'content_hash', 'width', 'height', 'frame_count', 'byte_size'],
+        _generate_sprites_csv,
+        False,
+        (['path'], ['content_hash', 'width', 'height', 'frame_count', 'byte_size']),
+    ),
+    (
+        'official artwork',
+        'pokemon_official_sprite',
+        ['sprite_path', 'pokemon_id', 'variant', 'is_shiny'],
+        _generate_official_artwork_csv,
+        True,
+        None,
+    ),
+    (
+        'default artwork',
+        'pokemon_default_sprite',
+        ['sprite_path', 'pokemon_id', 'variant', 'is_shiny', 'is_female', 'is_back', 'is_low_res'],
+        _generate_default_sprite_csv,
+        True,
+        None,
+    ),
+    (
+        'misc artwork',
+        'pokemon_misc_sprite',
+        ['sprite_path', 'pokemon_id', 'variant', 'category', 'is_female', 'is_shiny', 'is_back'],
+        _generate_misc_sprite_csv,
+        True,
+        None,
+    ),
+    (
+        'version artwork',
+        'pokemon_version_sprite',
         [
-            'sprite_path', 'version_id', 'is_shiny', 'is_female', 'is_back',
+            'sprite_path', 'pokemon_id', 'variant', 'version_id', 'is_shiny', 'is_female', 'is_back',
             'is_grey', 'is_animated', 'is_transparent',
         ],
-    )
+        _generate_version_sprite_csv,
+        True,
+        None,
+    ),
+]
 
-    subrows = 0
-    for version_dir in base_dir.glob('generation*/*/'):
-        if version_dir.name == 'icons':
-            continue
 
-        versions = version_regex.findall(version_dir.name.lower())
+# Functions
 
-        if not versions:
-            warning(f'Unknown version name for path: {version_dir}')
-            continue
+def sprite_inputs():
+    versions = os.stat(_CSV_DIR / 'versions.csv')
+    yield 'versions.csv', versions.st_size, versions.st_mtime, _MAPPER_VERSION
 
-        version_ids = [version_lookup[version] for version in versions]
-
-        for file in _itr_image_files(version_dir):
-            if not _is_valid_sprite(file):
-                continue
-
-            flags = _extract_flags(file.relative_to(version_dir).parts)
-            path = file.relative_to(_SPRITES_DIR)
-
-            for version_id in version_ids:
-                writer.writerow(
-                    [
-                        str(path),
-                        version_id,
-                        flags[_FLAG_SHINY],
-                        flags[_FLAG_FEMALE],
-                        flags[_FLAG_BACK],
-                        flags[_FLAG_GREY],
-                        flags[_FLAG_ANIMATED],
-                        flags[_FLAG_TRANSPARENT],
-                    ],
-                )
-                subrows += 1
+    if _SPRITE_ARCHIVE is not None:
+        archive = os.stat(_SPRITE_ARCHIVE)
+        yield str(_SPRITE_ARCHIVE), archive.st_size, archive.st_mtime
+        return
 
-    debug(f'Found {subrows} version sprites')
+    # Cloned first, a scan of the empty directory would otherwise be handed to the stage
+    _ensure_sprite_repo_cloned()
+    sprites = _scan_sprites()
+    _scan_cache['sprites'] = sprites
+
+    # Sorted, the order a directory lists its entries in says nothing about the sprites
+    yield from sorted((sprite.path, sprite.size, sprite.mtime) for sprite in sprites)
 
-    buffer.seek(0)
-    return buffer
+
+def iter_sprite_payloads():
+    _ensure_sprite_repo_cloned()
+
+    sprites = _scan_sprites()
+
+    # Nothing to reuse without a database, every sprite is inspected
+    sprites = _inspect_sprites(sprites = sprites, snapshot = { })
+
+    for _, table_name, headers, generator, has_generated_primary, upsert in _SPRITE_TABLES:
+        yield (
+            table_name,
+            RowStream(headers = headers, rows = generator(sprites)),
+            has_generated_primary,
+            upsert,
+            _SPRITE_TABLE_DEPENDENCIES.get(table_name, []),
+        )
 
 
 # Main Function
@@ -346,114 +667,112 @@ def _generate_version_sprite_csv():
 def ingest_sprites(conn):
     _ensure_sprite_repo_cloned()
 
-    sprite_buffer = None
-    try:
-        info('Parsing sprites')
-        sprite_buffer = _generate_sprites_csv()
-        info('Done parsing sprites')
-    except Exception as e:
-        error(f'Failed to parse sprites: {e}')
-
-    official_buffer = None
-    try:
-        info('Parsing official artwork')
-        official_buffer = _generate_official_artwork_csv()
-        info('Done parsing official artwork')
-    except Exception as e:
-        error(f'Failed to parse official artwork: {e}')
-
-    default_buffer = None
-    try:
-        info('Parsing default artwork')
-        default_buffer = _generate_default_sprite_csv()
-        info('Done parsing default artwork')
-    except Exception as e:
-        error(f'Failed to parse default artwork: {e}')
+    # Loaded before the scan, extracting an archive skips members the snapshot already has
+    snapshot = _load_snapshot(conn)
 
-    misc_buffer = None
     try:
-        info('Parsing misc artwork')
-        misc_buffer = _generate_misc_sprite_csv()
-        info('Done parsing misc artwork')
+        info('Scanning sprites')
+        sprites = _scan_sprites(snapshot = snapshot)
+        info('Done scanning sprites')
     except Exception as e:
-        error(f'Failed to parse misc artwork: {e}')
+        error(f'Failed to scan sprites: {e}')
+        return False
 
-    versions_buffer = None
     try:
-        info('Parsing version artwork')
-        versions_buffer = _generate_version_sprite_csv()
-        info('Done parsing version artwork')
+        info('Inspecting sprites')
+        sprites = _inspect_sprites(sprites = sprites, snapshot = snapshot)
+        info('Done inspecting sprites')
     except Exception as e:
-        error(f'Failed to parse version artwork: {e}')
+        error(f'Failed to inspect sprites: {e}')
+        return False
 
-    try:
-        if sprite_buffer:
-            info('Inserting sprites')
-            ingest_csv(conn = conn, csv_source = sprite_buffer, table_name = 'pokemon_sprite')
-            info('Done inserting sprites')
-        else:
-            warning('No sprites to insert, skipping')
-    except Exception as e:
-        error(f'Failed to insert sprites: {e}')
+    if _HARDLINK_DUPLICATES:
+        try:
+            info('Hardlinking duplicate sprites')
+            sprites = _hardlink_sprites(sprites)
+            info('Done hardlinking duplicate sprites')
+        except Exception as e:
+            error(f'Failed to hardlink duplicate sprites: {e}')
+
+    if _PRECOMPRESS:
+        try:
+            info('Compressing sprites')
+            _compress_sprites(sprites = sprites, snapshot = snapshot)
+            info('Done compressing sprites')
+        except Exception as e:
+            error(f'Failed to compress sprites: {e}')
 
     try:
-        if official_buffer:
-            info('Inserting official artwork')
-            ingest_csv(
-                conn = conn,
-                csv_source = official_buffer,
-                table_name = 'pokemon_official_sprite',
-                has_generated_primary = True,
-            )
-            info('Done inserting official artwork')
-        else:
-            warning('No official artwork to insert, skipping')
+        write_nginx_config(file_count = len(sprites))
     except Exception as e:
-        error(f'Failed to insert official artwork: {e}')
+        error(f'Failed to write nginx config: {e}')
 
-    try:
-        if default_buffer:
-            info('Inserting default artwork')
-            ingest_csv(
-                conn = conn,
-                csv_source = default_buffer,
-                table_name = 'pokemon_default_sprite',
-                has_generated_primary = True,
-            )
-            info('Done inserting default artwork')
-        else:
-            warning('No default artwork to insert, skipping')
-    except Exception as e:
-        error(f'Failed to insert default artwork: {e}')
+    delta = _plan_delta(snapshot = snapshot, sprites = sprites) if _DELTA_INGEST else None
 
-    try:
-        if misc_buffer:
-            info('Inserting misc artwork')
-            ingest_csv(
-                conn = conn,
-                csv_source = misc_buffer,
-                table_name = 'pokemon_misc_sprite',
-                has_generated_primary = True,
+    if delta is None:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM sprite_snapshot;
+                """
             )
-            info('Done inserting misc artwork')
-        else:
-            warning('No misc artwork to insert, skipping')
-    except Exception as e:
-        error(f'Failed to insert misc artwork: {e}')
+    else:
+        stale_paths, sprites = delta
+
+        try:
+            info('Deleting stale sprites')
+            with measure('delete', 'pokemon_sprite') as metrics:
+                _delete_sprites(conn = conn, paths = stale_paths)
+                metrics.rows_in = len(stale_paths)
+            info('Done deleting stale sprites')
+        except Exception as e:
+            error(f'Failed to delete stale sprites: {e}')
+            return False
 
-    try:
-        if versions_buffer:
-            info('Inserting version artwork')
-            ingest_csv(
-                conn = conn,
-                csv_source = versions_buffer,
-                table_name = 'pokemon_version_sprite',
-                has_generated_primary = True,
-            )
-            info('Done inserting version artwork')
-        else:
-            warning('No version artwork to insert, skipping')
-    except Exception as e:
-        error(f'Failed to insert version artwork: {e}')
+    failed = False
+    for label, table_name, headers, generator, has_generated_primary, upsert in _SPRITE_TABLES:
+        conflict_columns, update_columns = upsert or (None, None)
+
+        try:
+            info(f'Inserting {label}')
+            # A failed table is rolled back on its own instead of aborting every table after it
+            with savepoint(conn, 'sprite_table'):
+                ingest_csv(
+                    conn = conn,
+                    csv_source = RowStream(headers = headers, rows = generator(sprites)),
+                    table_name = table_name,
+                    has_generated_primary = has_generated_primary,
+                    conflict_columns = conflict_columns,
+                    update_columns = update_columns,
+                )
+            info(f'Done inserting {label}')
+        except Exception as e:
+            error(f'Failed to insert {label}: {e}')
+            failed = True
+
+    # A snapshot is only trustworthy if every table saw the sprites it lists, otherwise the next delta would skip them
+    if failed:
+        warning('Not recording sprite snapshot, the next delta ingest will fall back to a full ingest')
+    else:
+        try:
+            info('Recording sprite snapshot')
+            with savepoint(conn, 'sprite_snapshot'):
+                ingest_csv(
+                    conn = conn,
+                    csv_source = RowStream(
+                        headers = ['path', 'size_bytes', 'mtime', 'content_hash'],
+                        rows = ((sprite.path, sprite.size, sprite.mtime, sprite.content_hash) for sprite in sprites),
+                    ),
+                    table_name = 'sprite_snapshot',
+                    # Refreshed sprites are already listed, but without the hash they have just been inspected for
+                    conflict_columns = ['path'],
+                    update_columns = ['size_bytes', 'mtime', 'content_hash'],
+                )
+            info('Done recording sprite snapshot')
+        except Exception as e:
+            error(f'Failed to record sprite snapshot: {e}')
+            failed = True
 
     conn.commit()
+
+    return not failed
@@ -0,0 +1,328 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import datetime
+import os
+import pathlib
+import re
+import sqlite3
+from collections import namedtuple
+from psycopg2 import sql
+from logger import debug, info, warning, error, critical
+from metrics import measure
+from checkpoint import checkpoint_hashes
+
+# Constants
+
+SQLITE_EXPORT = os.getenv('SQLITE_EXPORT', 'false').lower() == 'true'
+
+_EXPORT_PATH = pathlib.Path(os.getenv('SQLITE_EXPORT_PATH', 'export/pokebe.sqlite'))
+
+# 'text' stores enum labels, 'code' stores their 1-based position and adds an enum_label table to decode them
+_ENUM_ENCODING = os.getenv('SQLITE_EXPORT_ENUMS', 'text').lower()
+
+_BATCH_ROWS = int(os.getenv('SQLITE_EXPORT_BATCH_ROWS', 10000))
+
+_EXPORT_TABLES = [
+    'pokemon',
+    'species',
+    'item',
+    'type_metadata',
+    'pokemon_sprite',
+    'pokemon_official_sprite',
+    'pokemon_default_sprite',
+    'pokemon_misc_sprite',
+    'pokemon_version_sprite',
+]
+
+# Merge bookkeeping, nothing an edge reader queries
+_SKIPPED_COLUMNS = ['row_hash']
+
+# Partial index predicates SQLite reads the same way, e.g. is_default or (secondarytype IS NOT NULL)
+_PORTABLE_PREDICATE_REGEX = re.compile(r'^\(?(?:NOT )?\w+(?: IS (?:NOT )?NULL)?\)?$')
+
+_SQLITE_AFFINITIES = {
+    'int2'   : 'INTEGER',
+    'int4'   : 'INTEGER',
+    'int8'   : 'INTEGER',
+    'bool'   : 'INTEGER',
+    'float4' : 'REAL',
+    'float8' : 'REAL',
+    'numeric': 'REAL',
+}
+
+
+# Classes
+
+CatalogColumn = namedtuple('CatalogColumn', ['attnum', 'name', 'type_name', 'type_type', 'not_null'])
+
+
+# Utilities
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _table_exists(cur, table_name):
+    cur.execute('SELECT to_regclass(%s) IS NOT NULL;', (table_name,))
+    return cur.fetchone()[0]
+
+
+def _load_columns(cur, table_name):
+    cur.execute(
+        """
+        SELECT a.attnum, a.attname, t.typname, t.typtype, a.attnotnull
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped AND a.attname <> ALL(%s)
+        ORDER BY a.attnum;
+        """,
+        (table_name, _SKIPPED_COLUMNS),
+    )
+
+    return [CatalogColumn(*row) for row in cur.fetchall()]
+
+
+def _load_indexes(cur, table_name):
+    cur.execute(
+        """
+        SELECT c.relname, i.indisprimary, i.indisunique, i.indnkeyatts, i.indkey::INT2[],
+               pg_get_expr(i.indpred, i.indrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+        ORDER BY c.relname;
+        """,
+        (table_name,),
+    )
+
+    return cur.fetchall()
+
+
+def _load_enum_labels(cur, type_names):
+    # Resolved through the search path, retired schemas carry enums of the same name
+    cur.execute(
+        """
+        SELECT t.typname, row_number() OVER (PARTITION BY t.oid ORDER BY e.enumsortorder), e.enumlabel
+        FROM pg_enum e
+        JOIN pg_type t ON t.oid = e.enumtypid
+        WHERE t.oid = ANY(%s::REGTYPE[]);
+        """,
+        (sorted(type_names),),
+    )
+
+    return cur.fetchall()
+
+
+def _sqlite_type(column):
+    if column.type_type == 'e':
+        return 'INTEGER' if _ENUM_ENCODING == 'code' else 'TEXT'
+
+    return _SQLITE_AFFINITIES.get(column.type_name, 'TEXT')
+
+
+def _select_expression(column):
+    identifier = sql.Identifier(column.name)
+
+    if column.type_type != 'e':
+        return identifier
+
+    # Converted by Postgres, rows arrive ready to insert
+    if _ENUM_ENCODING == 'code':
+        return sql.SQL('array_position(enum_range(NULL::{}), {})').format(sql.Identifier(column.type_name), identifier)
+
+    return sql.SQL('{}::TEXT').format(identifier)
+
+
+def _create_table(sqlite_conn, table_name, columns, primary_key):
+    definitions = []
+    rowid_alias = len(primary_key) == 1 and _sqlite_type(primary_key[0]) == 'INTEGER'
+
+    for column in columns:
+        definition = f'{_quote(column.name)} {_sqlite_type(column)}'
+
+        # A single integer key becomes the rowid itself, any other key makes the table clustered on it
+        if rowid_alias and column == primary_key[0]:
+            definition += ' PRIMARY KEY'
+        elif column.not_null:
+            definition += ' NOT NULL'
+
+        definitions.append(definition)
+
+    suffix = ''
+    if primary_key and not rowid_alias:
+        definitions.append(f'PRIMARY KEY ({", ".join(_quote(column.name) for column in primary_key)})')
+        suffix = ' WITHOUT ROWID'
+
+    sqlite_conn.execute(f'CREATE TABLE {_quote(table_name)} ({", ".join(definitions)}){suffix};')
+
+
+def _copy_rows(conn, sqlite_conn, table_name, columns, metrics):
+    query = sql.SQL('SELECT {} FROM {};').format(
+        sql.SQL(', ').join(_select_expression(column) for column in columns),
+        sql.Identifier(table_name),
+    )
+    insert = f'INSERT INTO {_quote(table_name)} VALUES ({", ".join("?" for _ in columns)});'
+
+    # A named cursor keeps the rows on the server, only one batch is ever held in memory
+    with conn.cursor(name = f'sqlite_export_{table_name}') as cur:
+        cur.itersize = _BATCH_ROWS
+        cur.execute(query)
+
+        for rows in iter(lambda: cur.fetchmany(_BATCH_ROWS), []):
+            sqlite_conn.executemany(insert, rows)
+            metrics.rows_out += len(rows)
+
+
+def _create_indexes(sqlite_conn, table_name, columns, indexes):
+    names = { column.attnum: column.name for column in columns }
+
+    for index_name, is_primary, is_unique, key_count, attnums, predicate in indexes:
+        if is_primary:
+            continue
+
+        if 0 in attnums or (predicate is not None and not _PORTABLE_PREDICATE_REGEX.match(predicate)):
+            debug(f'Not exporting {index_name}, its predicate or expressions are Postgres specific')
+            continue
+
+        # SQLite has no INCLUDE, trailing key columns make the index covering all the same
+        key_columns = attnums[:key_count] if is_unique else attnums
+        unique = 'UNIQUE ' if is_unique else ''
+
+        where = f' WHERE {predicate}' if predicate is not None else ''
+
+        sqlite_conn.execute(
+            f'CREATE {unique}INDEX {_quote(index_name)} ON {_quote(table_name)} '
+            f'({", ".join(_quote(names[attnum]) for attnum in key_columns)}){where};'
+        )
+
+
+def _export_table(conn, sqlite_conn, table_name):
+    with conn.cursor() as cur:
+        columns = _load_columns(cur = cur, table_name = table_name)
+        indexes = _load_indexes(cur = cur, table_name = table_name)
+
+    by_attnum = { column.attnum: column for column in columns }
+    primary_key = []
+    for _, is_primary, _, key_count, attnums, _ in indexes:
+        if is_primary:
+            primary_key = [by_attnum[attnum] for attnum in attnums[:key_count]]
+
+    with measure('sqlite_export', table_name) as metrics:
+        _create_table(sqlite_conn = sqlite_conn, table_name = table_name, columns = columns, primary_key = primary_key)
+        _copy_rows(
+            conn = conn,
+            sqlite_conn = sqlite_conn,
+            table_name = table_name,
+            columns = columns,
+            metrics = metrics,
+        )
+        _create_indexes(sqlite_conn = sqlite_conn, table_name = table_name, columns = columns, indexes = indexes)
+        metrics.rows_in = metrics.rows_out
+
+    info(f'Exported {metrics.rows_out} rows of {table_name}')
+
+    return { column.type_name for column in columns if column.type_type == 'e' }
+
+
+def _write_enum_labels(conn, sqlite_conn, enum_types):
+    with conn.cursor() as cur:
+        labels = _load_enum_labels(cur = cur, type_names = enum_types)
+
+    sqlite_conn.execute(
+        'CREATE TABLE enum_label (type TEXT NOT NULL, code INTEGER NOT NULL, label TEXT NOT NULL, '
+        'PRIMARY KEY (type, code)) WITHOUT ROWID;'
+    )
+    sqlite_conn.executemany('INSERT INTO enum_label VALUES (?, ?, ?);', labels)
+
+
+def _write_export_info(sqlite_conn):
+    sqlite_conn.execute('CREATE TABLE export_info (key TEXT NOT NULL PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;')
+    sqlite_conn.executemany(
+        'INSERT INTO export_info VALUES (?, ?);',
+        [
+            ('exported_at', datetime.datetime.now(datetime.timezone.utc).isoformat()),
+            ('enum_encoding', _ENUM_ENCODING),
+        ],
+    )
+
+
+# Functions
+
+def sqlite_export_inputs(conn, upstream_stages):
+    yield str(_EXPORT_PATH), _ENUM_ENCODING, tuple(_EXPORT_TABLES)
+
+    # The data only changes when a stage before the export loaded something new, one without a checkpoint may have
+    for stage_name, input_hash in checkpoint_hashes(conn = conn, stage_names = upstream_stages):
+        if input_hash is None:
+            raise ValueError(f'{stage_name} has no checkpoint to tell whether its data changed')
+        yield stage_name, input_hash
+
+
+def sqlite_export_outputs():
+    # A snapshot that was deleted or replaced since it was exported is exported again
+    if not _EXPORT_PATH.exists():
+        yield None
+        return
+
+    stat = _EXPORT_PATH.stat()
+    yield stat.st_size, stat.st_mtime_ns
+
+
+def export_sqlite(conn):
+    info(f'Exporting SQLite snapshot to {_EXPORT_PATH}...')
+    _EXPORT_PATH.parent.mkdir(parents = True, exist_ok = True)
+
+    # Built next to the old file and swapped in whole, readers never open a half written snapshot
+    tmp_path = _EXPORT_PATH.with_name(f'.{_EXPORT_PATH.name}.tmp')
+    tmp_path.unlink(missing_ok = True)
+
+    sqlite_conn = sqlite3.connect(tmp_path, isolation_level = None)
+    try:
+        # Nothing to recover on a crash, the temporary file is simply built again
+        sqlite_conn.execute('PRAGMA journal_mode = OFF;')
+        sqlite_conn.execute('PRAGMA synchronous = OFF;')
+        sqlite_conn.execute('BEGIN;')
+
+        enum_types = set()
+        for table_name in _EXPORT_TABLES:
+            with conn.cursor() as cur:
+                exists = _table_exists(cur = cur, table_name = table_name)
+
+            if not exists:
+                warning(f'Not exporting {table_name}, the table does not exist')
+                continue
+
+            enum_types |= _export_table(conn = conn, sqlite_conn = sqlite_conn, table_name = table_name)
+
+        if _ENUM_ENCODING == 'code':
+            _write_enum_labels(conn = conn, sqlite_conn = sqlite_conn, enum_types = enum_types)
+
+        _write_export_info(sqlite_conn)
+
+        sqlite_conn.execute('COMMIT;')
+        sqlite_conn.execute('ANALYZE;')
+        sqlite_conn.execute('VACUUM;')
+    finally:
+        sqlite_conn.close()
+        conn.rollback()
+
+    os.replace(tmp_path, _EXPORT_PATH)
+    info(f'Done exporting SQLite snapshot, {_EXPORT_PATH.stat().st_size} bytes')
+
+    return True
@@ -0,0 +1,118 @@
+#  Copyright 2025 Patrick Hoette
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#  THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+#  PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+#  LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+#  OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#  OTHER DEALINGS IN THE SOFTWARE.
+
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+#  documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+#  to permit persons to whom the Software is furnished to do so.
+#
+import csv
+import operator
+from collections import namedtuple
+from logger import debug, info, warning, error, critical
+from frame_utils import int_column, optional_int_column, bool_column, enum_column
+
+# Constants
+
+_NULL_VALUES = frozenset(['', '\\N'])
+
+
+# Classes
+
+# A converter has a per value form for the row engine and a per column form for the columnar engine
+Converter = namedtuple('Converter', ['row', 'column'])
+
+Column = namedtuple('Column', ['target', 'source', 'converter', 'nullable'], defaults = (False,))
+
+
+# Converters
+
+TEXT = Converter(
+    row = None,
+    column = lambda column, nullable: column,
+)
+
+INT = Converter(
+    row = int,
+    column = lambda column, nullable: optional_int_column(column) if nullable else int_column(column),
+)
+
+FLAG = Converter(
+    row = lambda value: value == '1',
+    column = lambda column, nullable: bool_column(column),
+)
+
+
+def enum(enum_map):
+    return Converter(
+        row = enum_map.__getitem__,
+        column = lambda column, nullable: enum_column(column, enum_map, optional = nullable),
+    )
+
+
+def lookup(values, default = None):
+    int_values = { int(key): value for key, value in values.items() }
+
+    return Converter(
+        row = lambda value: int_values.get(int(value), default),
+        column = lambda column, nullable: column.map(int_values),
+    )
+
+
+# Utilities
+
+def _row_converter(column):
+    # str hands a str back as is, so text columns pass through without a Python level call
+    convert = column.converter.row or str
+    if not column.nullable:
+        return convert
+
+    return lambda value: None if value in _NULL_VALUES else convert(value)
+
+
+# Functions
+
+def read_header(path):
+    with path.open('r', encoding = 'utf-8', newline = '') as f:
+        return next(csv.reader(f), [])
+
+
+def find_missing_sources(columns, header):
+    header = set(header)
+    return [column.source for column in columns if column.source not in header]
+
+
+def text_sources(columns):
+    return [column.source for column in columns if column.converter is TEXT]
+
+
+def compile_row_mapper(columns, header):
+    missing = find_missing_sources(columns = columns, header = header)
+    if missing:
+        raise ValueError(f'Source header is missing columns {missing}')
+
+    positions = { name: position for position, name in enumerate(header) }
+    pick = operator.itemgetter(*(positions[column.source] for column in columns))
+    converters = tuple(_row_converter(column) for column in columns)
+
+    # itemgetter picks a single column as a bare value rather than a 1-tuple
+    if len(columns) == 1:
+        convert, = converters
+        return lambda row: (convert(pick(row)),)
+
+    # map and operator.call dispatch to the converters without a Python frame of their own per value
+    return lambda row: tuple(map(operator.call, converters, pick(row)))
+
+
+def compile_frame_mapper(columns):
+    return lambda frame: [column.converter.column(frame[column.source], column.nullable) for column in columns]
@@ -16,5 +16,8 @@
 
 CREATE TABLE IF NOT EXISTS evolution_chain (
     id                   INTEGER NOT NULL PRIMARY KEY,
-    baby_trigger_item_id INTEGER
+    baby_trigger_item_id INTEGER,
+    row_hash             UUID
 );
+
+ALTER TABLE evolution_chain ADD COLUMN IF NOT EXISTS row_hash UUID;
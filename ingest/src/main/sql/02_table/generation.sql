@@ -17,5 +17,8 @@
 CREATE TABLE IF NOT EXISTS generation (
     id             INTEGER NOT NULL PRIMARY KEY,
     main_region_id INTEGER NOT NULL,
-    name           TEXT    NOT NULL
+    name           TEXT    NOT NULL,
+    row_hash       UUID
 );
+
+ALTER TABLE generation ADD COLUMN IF NOT EXISTS row_hash UUID;
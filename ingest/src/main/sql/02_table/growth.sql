@@ -15,6 +15,9 @@
  */
 
 CREATE TABLE IF NOT EXISTS growth_metadata (
-    rate    GROWTH_RATE NOT NULL PRIMARY KEY,
-    formula TEXT
+    rate     GROWTH_RATE NOT NULL PRIMARY KEY,
+    formula  TEXT,
+    row_hash UUID
 );
+
+ALTER TABLE growth_metadata ADD COLUMN IF NOT EXISTS row_hash UUID;
@@ -20,11 +20,17 @@ CREATE TABLE IF NOT EXISTS item (
     category_id  INTEGER NOT NULL,
     cost         INTEGER NOT NULL,
     fling_power  INTEGER,
-    fling_effect FLING_EFFECT
+    fling_effect FLING_EFFECT,
+    row_hash     UUID
 );
 
+ALTER TABLE item ADD COLUMN IF NOT EXISTS row_hash UUID;
+
 CREATE TABLE IF NOT EXISTS item_category (
-    id     INTEGER     NOT NULL PRIMARY KEY,
-    pocket ITEM_POCKET NOT NULL,
-    name   TEXT
+    id       INTEGER     NOT NULL PRIMARY KEY,
+    pocket   ITEM_POCKET NOT NULL,
+    name     TEXT,
+    row_hash UUID
 );
+
+ALTER TABLE item_category ADD COLUMN IF NOT EXISTS row_hash UUID;
@@ -0,0 +1,41 @@
+/*
+ * Copyright 2025 Patrick Hoette
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+ * documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+ * to permit persons to whom the Software is furnished to do so.
+ *
+ * THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ * INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ * PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+ * LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+ * OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+ * OTHER DEALINGS IN THE SOFTWARE.
+ */
+
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    table_name     TEXT             NOT NULL,
+    file_name      TEXT             NOT NULL,
+    size_bytes     BIGINT           NOT NULL,
+    mtime          DOUBLE PRECISION NOT NULL,
+    content_hash   TEXT             NOT NULL,
+    mapper_version INTEGER          NOT NULL,
+    PRIMARY KEY (table_name, file_name)
+);
+
+CREATE TABLE IF NOT EXISTS sprite_snapshot (
+    path         TEXT             NOT NULL PRIMARY KEY,
+    size_bytes   BIGINT           NOT NULL,
+    mtime        DOUBLE PRECISION NOT NULL,
+    content_hash TEXT
+);
+
+ALTER TABLE sprite_snapshot ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- The inputs each ingest stage last completed against, a restarted ingest resumes from the first stage not listed
+CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+    stage        TEXT        NOT NULL PRIMARY KEY,
+    input_hash   TEXT        NOT NULL,
+    completed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -24,5 +24,8 @@ CREATE TABLE IF NOT EXISTS pokemon (
     weight_hg       INTEGER NOT NULL,
     base_experience INTEGER NOT NULL,
     natural_order   INTEGER,
-    is_default      BOOLEAN NOT NULL
+    is_default      BOOLEAN NOT NULL,
+    row_hash        UUID
 );
+
+ALTER TABLE pokemon ADD COLUMN IF NOT EXISTS row_hash UUID;
@@ -17,5 +17,8 @@
 CREATE TABLE IF NOT EXISTS type_metadata (
     ptype         PTYPE        NOT NULL PRIMARY KEY,
     generation_id INTEGER      NOT NULL,
-    damage_class  DAMAGE_CLASS
+    damage_class  DAMAGE_CLASS,
+    row_hash      UUID
 );
+
+ALTER TABLE type_metadata ADD COLUMN IF NOT EXISTS row_hash UUID;
@@ -15,6 +15,9 @@
  */
 
 CREATE TABLE IF NOT EXISTS region (
-    id   INTEGER NOT NULL PRIMARY KEY,
-    name TEXT    NOT NULL
+    id       INTEGER NOT NULL PRIMARY KEY,
+    name     TEXT    NOT NULL,
+    row_hash UUID
 );
+
+ALTER TABLE region ADD COLUMN IF NOT EXISTS row_hash UUID;
@@ -35,8 +35,11 @@ CREATE TABLE IF NOT EXISTS species (
     is_mythical           BOOLEAN     NOT NULL,
     natural_order         INTEGER     NOT NULL,
     conquest_order        INTEGER,
+    row_hash              UUID,
     CHECK ( gender_rate BETWEEN -1 AND 8 ),
     CHECK ( capture_rate BETWEEN 0 AND 255),
     CHECK ( base_happiness BETWEEN 0 AND 255),
     CHECK ( hatch_counter >= 0 )
 );
+
+ALTER TABLE species ADD COLUMN IF NOT EXISTS row_hash UUID;
@@ -15,20 +15,36 @@
  */
 
 CREATE TABLE IF NOT EXISTS pokemon_sprite (
-    path       TEXT    NOT NULL PRIMARY KEY,
-    pokemon_id INTEGER NOT NULL,
-    variant    TEXT
+    path         TEXT    NOT NULL PRIMARY KEY,
+    pokemon_id   INTEGER NOT NULL,
+    variant      TEXT,
+    content_hash TEXT,
+    width        INTEGER,
+    height       INTEGER,
+    frame_count  INTEGER,
+    byte_size    BIGINT
 );
 
+-- Added after the initial release, existing databases get the columns on their next setup in the same order
+ALTER TABLE pokemon_sprite ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE pokemon_sprite ADD COLUMN IF NOT EXISTS width INTEGER;
+ALTER TABLE pokemon_sprite ADD COLUMN IF NOT EXISTS height INTEGER;
+ALTER TABLE pokemon_sprite ADD COLUMN IF NOT EXISTS frame_count INTEGER;
+ALTER TABLE pokemon_sprite ADD COLUMN IF NOT EXISTS byte_size BIGINT;
+
 CREATE TABLE IF NOT EXISTS pokemon_official_sprite (
     id          INTEGER GENERATED ALWAYS AS IDENTITY NOT NULL PRIMARY KEY,
     sprite_path TEXT                                 NOT NULL,
+    pokemon_id  INTEGER                              NOT NULL,
+    variant     TEXT,
     is_shiny    BOOLEAN                              NOT NULL DEFAULT FALSE
 );
 
 CREATE TABLE IF NOT EXISTS pokemon_default_sprite (
     id          INTEGER GENERATED ALWAYS AS IDENTITY NOT NULL PRIMARY KEY,
     sprite_path TEXT                                 NOT NULL,
+    pokemon_id  INTEGER                              NOT NULL,
+    variant     TEXT,
     is_shiny    BOOLEAN                              NOT NULL DEFAULT FALSE,
     is_female   BOOLEAN                              NOT NULL DEFAULT FALSE,
     is_back     BOOLEAN                              NOT NULL DEFAULT FALSE,
@@ -38,6 +54,8 @@ CREATE TABLE IF NOT EXISTS pokemon_default_sprite (
 CREATE TABLE IF NOT EXISTS pokemon_misc_sprite (
     id          INTEGER GENERATED ALWAYS AS IDENTITY NOT NULL PRIMARY KEY,
     sprite_path TEXT                                 NOT NULL,
+    pokemon_id  INTEGER                              NOT NULL,
+    variant     TEXT,
     category    TEXT                                 NOT NULL,
     is_female   BOOLEAN                              NOT NULL DEFAULT FALSE,
     is_shiny    BOOLEAN                              NOT NULL DEFAULT FALSE,
@@ -47,6 +65,8 @@ CREATE TABLE IF NOT EXISTS pokemon_misc_sprite (
 CREATE TABLE IF NOT EXISTS pokemon_version_sprite (
     id             INTEGER GENERATED ALWAYS AS IDENTITY NOT NULL PRIMARY KEY,
     sprite_path    TEXT                                 NOT NULL,
+    pokemon_id     INTEGER                              NOT NULL,
+    variant        TEXT,
     version_id     INTEGER                              NOT NULL,
     is_shiny       BOOLEAN                              NOT NULL DEFAULT FALSE,
     is_female      BOOLEAN                              NOT NULL DEFAULT FALSE,
@@ -55,3 +75,33 @@ CREATE TABLE IF NOT EXISTS pokemon_version_sprite (
     is_animated    BOOLEAN                              NOT NULL DEFAULT FALSE,
     is_transparent BOOLEAN                              NOT NULL DEFAULT FALSE
 );
+
+-- Derived from the file name like pokemon_sprite's, backfilled from there for databases that predate the columns
+ALTER TABLE pokemon_official_sprite ADD COLUMN IF NOT EXISTS pokemon_id INTEGER;
+ALTER TABLE pokemon_official_sprite ADD COLUMN IF NOT EXISTS variant TEXT;
+ALTER TABLE pokemon_default_sprite ADD COLUMN IF NOT EXISTS pokemon_id INTEGER;
+ALTER TABLE pokemon_default_sprite ADD COLUMN IF NOT EXISTS variant TEXT;
+ALTER TABLE pokemon_misc_sprite ADD COLUMN IF NOT EXISTS pokemon_id INTEGER;
+ALTER TABLE pokemon_misc_sprite ADD COLUMN IF NOT EXISTS variant TEXT;
+ALTER TABLE pokemon_version_sprite ADD COLUMN IF NOT EXISTS pokemon_id INTEGER;
+ALTER TABLE pokemon_version_sprite ADD COLUMN IF NOT EXISTS variant TEXT;
+
+UPDATE pokemon_official_sprite t
+SET pokemon_id = s.pokemon_id, variant = s.variant
+FROM pokemon_sprite s
+WHERE t.pokemon_id IS NULL AND s.path = t.sprite_path;
+
+UPDATE pokemon_default_sprite t
+SET pokemon_id = s.pokemon_id, variant = s.variant
+FROM pokemon_sprite s
+WHERE t.pokemon_id IS NULL AND s.path = t.sprite_path;
+
+UPDATE pokemon_misc_sprite t
+SET pokemon_id = s.pokemon_id, variant = s.variant
+FROM pokemon_sprite s
+WHERE t.pokemon_id IS NULL AND s.path = t.sprite_path;
+
+UPDATE pokemon_version_sprite t
+SET pokemon_id = s.pokemon_id, variant = s.variant
+FROM pokemon_sprite s
+WHERE t.pokemon_id IS NULL AND s.path = t.sprite_path;
@@ -17,12 +17,18 @@
 CREATE TABLE IF NOT EXISTS version (
     id               INTEGER NOT NULL PRIMARY KEY,
     version_group_id INTEGER NOT NULL,
-    name             TEXT    NOT NULL
+    name             TEXT    NOT NULL,
+    row_hash         UUID
 );
 
+ALTER TABLE version ADD COLUMN IF NOT EXISTS row_hash UUID;
+
 CREATE TABLE IF NOT EXISTS version_group (
     id            INTEGER NOT NULL PRIMARY KEY,
     name          TEXT    NOT NULL,
     generation_id INTEGER NOT NULL,
-    natural_order INTEGER NOT NULL
+    natural_order INTEGER NOT NULL,
+    row_hash      UUID
 );
+
+ALTER TABLE version_group ADD COLUMN IF NOT EXISTS row_hash UUID;
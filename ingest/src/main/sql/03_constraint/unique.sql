@@ -15,6 +15,13 @@
  */
 
 -- Sprites
+ALTER TABLE pokemon_official_sprite
+ADD CONSTRAINT uq_pokemon_official_sprite
+UNIQUE (
+    sprite_path,
+    is_shiny
+);
+
 ALTER TABLE pokemon_default_sprite
 ADD CONSTRAINT uq_pokemon_default_sprite
 UNIQUE (
@@ -15,18 +15,41 @@
  */
 
 -- Sprites
-CREATE INDEX idx_pokemon_sprite_pokemon_id ON pokemon_sprite (pokemon_id);
+-- Per Pokémon lookups, the included columns let them answer from the index alone
+CREATE INDEX idx_pokemon_sprite_pokemon_id_variant
+ON pokemon_sprite (pokemon_id, variant) INCLUDE (path);
+
+CREATE INDEX idx_official_sprite_pokemon_id
+ON pokemon_official_sprite (pokemon_id, is_shiny) INCLUDE (sprite_path, variant);
+
+CREATE INDEX idx_default_sprite_pokemon_id
+ON pokemon_default_sprite (pokemon_id, variant) INCLUDE (sprite_path);
+
+CREATE INDEX idx_misc_sprite_pokemon_id_category
+ON pokemon_misc_sprite (pokemon_id, category) INCLUDE (sprite_path, variant);
+
+CREATE INDEX idx_version_sprite_pokemon_id_version
+ON pokemon_version_sprite (pokemon_id, version_id) INCLUDE (sprite_path, variant);
 
 CREATE INDEX idx_version_sprite_version ON pokemon_version_sprite (version_id);
 
 CREATE INDEX idx_misc_sprite_category ON pokemon_misc_sprite (category);
 
+CREATE INDEX idx_pokemon_sprite_content_hash ON pokemon_sprite (content_hash);
+
 -- Species
 CREATE INDEX IF NOT EXISTS idx_species_name
 ON species(name);
 
-CREATE INDEX IF NOT EXISTS idx_species_generation_id
-ON species(generation_id);
+-- Leads with generation_id, so it also serves the plain generation lookups and joins
+CREATE INDEX IF NOT EXISTS idx_species_generation_natural_order
+ON species(generation_id, natural_order) INCLUDE (id, name);
+
+CREATE INDEX IF NOT EXISTS idx_species_legendary_natural_order
+ON species(natural_order) INCLUDE (id, name, generation_id) WHERE is_legendary;
+
+CREATE INDEX IF NOT EXISTS idx_species_mythical_natural_order
+ON species(natural_order) INCLUDE (id, name, generation_id) WHERE is_mythical;
 
 CREATE INDEX IF NOT EXISTS idx_species_evolution_chain_id
 ON species(evolution_chain_id);
@@ -35,6 +58,20 @@ ON species(evolution_chain_id);
 CREATE INDEX IF NOT EXISTS idx_pokemon_species_id
 ON pokemon(species_id);
 
+-- Lists are ordered by natural_order and only show these columns, so pages never visit the heap
+CREATE INDEX IF NOT EXISTS idx_pokemon_natural_order
+ON pokemon(natural_order) INCLUDE (id, name, primaryType, secondaryType);
+
+CREATE INDEX IF NOT EXISTS idx_pokemon_default_natural_order
+ON pokemon(natural_order) INCLUDE (id, name, primaryType, secondaryType, species_id) WHERE is_default;
+
+CREATE INDEX IF NOT EXISTS idx_pokemon_primary_type_natural_order
+ON pokemon(primaryType, natural_order) INCLUDE (id, name, secondaryType);
+
+-- Most Pokémon have a single type, a filter on the second one never looks at those
+CREATE INDEX IF NOT EXISTS idx_pokemon_secondary_type_natural_order
+ON pokemon(secondaryType, natural_order) INCLUDE (id, name, primaryType) WHERE secondaryType IS NOT NULL;
+
 -- Item
 CREATE INDEX IF NOT EXISTS idx_item_name
 ON item(name);
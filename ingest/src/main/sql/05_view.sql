@@ -14,3 +14,12 @@
  * OTHER DEALINGS IN THE SOFTWARE.
  */
 
+-- Byte-identical sprites share the lexicographically first path as their canonical one
+CREATE OR REPLACE VIEW pokemon_sprite_canonical AS
+SELECT path,
+       content_hash,
+       CASE
+           WHEN content_hash IS NULL THEN path
+           ELSE MIN(path) OVER (PARTITION BY content_hash)
+       END AS canonical_path
+FROM pokemon_sprite;
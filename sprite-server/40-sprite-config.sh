@@ -0,0 +1,12 @@
+#!/bin/sh
+# Installs the nginx config the ingest service generates, the image default keeps serving until there is one
+set -e
+
+GENERATED_CONF=/etc/nginx/generated/sprites.conf
+
+if [ -f "$GENERATED_CONF" ]; then
+    cp "$GENERATED_CONF" /etc/nginx/conf.d/default.conf
+    echo "$0: installed $GENERATED_CONF"
+else
+    echo "$0: no $GENERATED_CONF yet, serving the default config"
+fi